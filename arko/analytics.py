@@ -0,0 +1,70 @@
+from typing import Dict, List, NamedTuple, Optional
+from django.db.models import Aggregate, Avg, Count, DecimalField, QuerySet, Sum
+
+from .models import CompanySummary
+
+DIMENSION_LABELS = {
+    'porte_empresa': 'Porte',
+    'natureza_juridica': 'Natureza Jurídica',
+    'qualificacao_responsavel': 'Qualificação do Responsável',
+}
+# Fractions of the capital_social percentiles stored in CompanySummary.
+PERCENTILES = {
+    'capital_p25': 0.25,
+    'capital_mediana': 0.5,
+    'capital_p75': 0.75,
+    'capital_p90': 0.9,
+}
+STATISTICS = ['empresas', 'capital_total', 'capital_medio', *PERCENTILES]
+
+
+class PercentileCont(Aggregate):
+    """`percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)`, the interpolated percentile of PostgreSQL."""
+    function = 'percentile_cont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, fraction:float, **extra):
+        super().__init__(expression, fraction=float(fraction), output_field=DecimalField(), **extra)
+
+
+def company_statistics() -> dict:
+    """The aggregates behind CompanySummary, for company sets it cannot answer, such as a razao_social search."""
+    return {
+        'empresas': Count('pk'),
+        'capital_total': Sum('capital_social'),
+        'capital_medio': Avg('capital_social'),
+        **{name: PercentileCont('capital_social', fraction) for name, fraction in PERCENTILES.items()},
+    }
+
+
+class Breakdown(NamedTuple):
+    group_by: str
+    # The value of `group_by` as 'valor', plus the STATISTICS.
+    rows: List[dict]
+    # The STATISTICS of every row together, None when nothing matched.
+    total: Optional[dict]
+
+
+def summary_breakdown(group_by:str, filters:Dict[str, Optional[str]]) -> Breakdown:
+    """
+    Reads the breakdown from CompanySummary: the rows grouped by `group_by` and by the
+    filtered dimensions, with the other dimensions rolled up, and the row of the filters alone
+    as the total. Both are index lookups on a few thousand precomputed rows.
+    """
+    fixed = {dimension: value for dimension, value in filters.items() if value}
+    rows = (
+        CompanySummary.objects
+        .filter(agregados=CompanySummary.grouping({*fixed, group_by}), **fixed)
+        .order_by(group_by)
+        .values(group_by, *STATISTICS)
+    )
+    total = CompanySummary.objects.filter(agregados=CompanySummary.grouping(fixed), **fixed).values(*STATISTICS).first()
+    return Breakdown(group_by, [{'valor': row.pop(group_by), **row} for row in rows], total)
+
+
+def live_breakdown(queryset:QuerySet, group_by:str) -> Breakdown:
+    """The same breakdown aggregated over `queryset`. Only fast for small sets."""
+    statistics = company_statistics()
+    rows = queryset.order_by(group_by).values(group_by).annotate(**statistics)
+    total = queryset.aggregate(**statistics)
+    return Breakdown(group_by, [{'valor': row.pop(group_by) or '', **row} for row in rows], total if total['empresas'] else None)
@@ -0,0 +1,123 @@
+from typing import List
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.views import View
+
+from .exports import EXPORT_FIELDS
+from .filters import CompanyFilter, DistrictFilter, MunicipalityFilter, StateFilter
+from .models import Company, District, Municipality, State
+from .pagination import KeysetPaginator
+from .search import RELEVANCE_FIELD, is_search
+
+PAGE_SIZE = 25
+
+
+class AsyncListAPIView(View):
+    """
+    JSON list of `model`, filtered by `filterset_class` with the same parameters as the HTML
+    list and paginated by `?page=`. The handlers are coroutines: served by an ASGI server, a
+    request waiting on Postgres holds no worker thread while it waits.
+
+    Responses are `{"count", "next", "previous", "results"}`, with `fields` as the keys of each
+    result. Anonymous requests get a 401, invalid filters a 400 with the form errors, and an
+    invalid cursor a 404.
+    """
+    model = None
+    filterset_class = None
+    # Names for values(), or (key, expression) pairs for related columns.
+    fields = ()
+    paginate_by = PAGE_SIZE
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': "Autenticação necessária."}, status=401)
+
+        # Validating the filters may read the reference tables (choices), so it runs in a thread.
+        filterset = await sync_to_async(self.build_filterset)(request)
+        if not filterset.is_valid():
+            return JsonResponse({'errors': filterset.errors}, status=400)
+        try:
+            return await self.paginate(request, filterset.qs)
+        except Http404 as e:
+            return JsonResponse({'detail': str(e)}, status=404)
+
+    def build_filterset(self, request):
+        filterset = self.filterset_class(request.GET, queryset=self.model.objects.all())
+        filterset.is_valid()
+        return filterset
+
+    def values(self, queryset):
+        names = [field for field in self.fields if isinstance(field, str)]
+        expressions = dict(field for field in self.fields if not isinstance(field, str))
+        return queryset.values(*names, **expressions)
+
+    async def paginate(self, request, queryset):
+        page = request.GET.get('page', '1')
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+        offset = (page - 1) * self.paginate_by
+
+        count = await queryset.acount()
+        rows = [row async for row in self.values(queryset)[offset:offset + self.paginate_by].aiterator()]
+        return JsonResponse({
+            'count': count,
+            'next': self.page_url(request, page=page + 1) if offset + self.paginate_by < count else None,
+            'previous': self.page_url(request, page=page - 1) if page > 1 else None,
+            'results': rows,
+        })
+
+    def page_url(self, request, **params) -> str:
+        query = request.GET.copy()
+        for key, value in params.items():
+            if value is None:
+                query.pop(key, None)
+            else:
+                query[key] = value
+        return f'{request.path}?{query.urlencode()}'
+
+
+class StateListAPIView(AsyncListAPIView):
+    model = State
+    filterset_class = StateFilter
+    fields = ('id', 'sigla', 'nome', 'regiao_id', ('regiao_nome', F('regiao__nome')))
+
+
+class MunicipalityListAPIView(AsyncListAPIView):
+    model = Municipality
+    filterset_class = MunicipalityFilter
+    fields = ('id', 'nome', 'estado_id', ('estado_sigla', F('estado__sigla')))
+
+
+class DistrictListAPIView(AsyncListAPIView):
+    model = District
+    filterset_class = DistrictFilter
+    fields = ('id', 'nome', 'municipio_id', ('municipio_nome', F('municipio__nome')), 'estado_id', ('estado_sigla', F('estado__sigla')))
+
+
+class CompanyListAPIView(AsyncListAPIView):
+    """
+    Companies by keyset pagination (`?after=`/`?before=`), like CompanyListView: `count` is
+    exact up to EXACT_COUNT_LIMIT and the planner estimate above it (`count_is_estimate`).
+    """
+    model = Company
+    filterset_class = CompanyFilter
+    fields = EXPORT_FIELDS
+    keyset_ordering = ('razao_social', 'cnpj')
+
+    async def paginate(self, request, queryset):
+        paginator = KeysetPaginator(queryset.only(*self.fields), self.paginate_by, self.keyset_ordering)
+        await paginator.acount()
+        if is_search(queryset) and not paginator.count_is_estimate:
+            paginator.ordering = [f'-{RELEVANCE_FIELD}', *self.keyset_ordering]
+        page = await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+        return JsonResponse({
+            'count': paginator.count,
+            'count_is_estimate': paginator.count_is_estimate,
+            'next': self.page_url(request, after=page.next_cursor, before=None) if page.has_next() else None,
+            'previous': self.page_url(request, before=page.previous_cursor, after=None) if page.has_previous() else None,
+            'results': self.serialize(page.object_list),
+        })
+
+    def serialize(self, companies) -> List[dict]:
+        return [{field: getattr(company, field) for field in self.fields} for company in companies]
@@ -0,0 +1,11 @@
+from django.urls import path
+from .api import CompanyListAPIView, DistrictListAPIView, MunicipalityListAPIView, StateListAPIView
+
+app_name = 'api'
+
+urlpatterns = [
+    path('states/', StateListAPIView.as_view(), name='state-list'),
+    path('municipalities/', MunicipalityListAPIView.as_view(), name='municipality-list'),
+    path('districts/', DistrictListAPIView.as_view(), name='district-list'),
+    path('companies/', CompanyListAPIView.as_view(), name='company-list'),
+]
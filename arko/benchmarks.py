@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEED = 20250510
+# Rows per write of the generated CSV.
+GENERATOR_CHUNK_ROWS = 10000
+
+REGIONS = [(1, 'N', 'Norte'), (2, 'NE', 'Nordeste'), (3, 'SE', 'Sudeste'), (4, 'S', 'Sul'), (5, 'CO', 'Centro-Oeste')]
+# (id, sigla, nome, region id, number of municipalities): the 5,570 municipalities of the real API.
+STATES = [
+    (11, 'RO', 'Rondônia', 1, 52), (12, 'AC', 'Acre', 1, 22), (13, 'AM', 'Amazonas', 1, 62),
+    (14, 'RR', 'Roraima', 1, 15), (15, 'PA', 'Pará', 1, 144), (16, 'AP', 'Amapá', 1, 16),
+    (17, 'TO', 'Tocantins', 1, 139), (21, 'MA', 'Maranhão', 2, 217), (22, 'PI', 'Piauí', 2, 224),
+    (23, 'CE', 'Ceará', 2, 184), (24, 'RN', 'Rio Grande do Norte', 2, 167), (25, 'PB', 'Paraíba', 2, 223),
+    (26, 'PE', 'Pernambuco', 2, 185), (27, 'AL', 'Alagoas', 2, 102), (28, 'SE', 'Sergipe', 2, 75),
+    (29, 'BA', 'Bahia', 2, 417), (31, 'MG', 'Minas Gerais', 3, 853), (32, 'ES', 'Espírito Santo', 3, 78),
+    (33, 'RJ', 'Rio de Janeiro', 3, 92), (35, 'SP', 'São Paulo', 3, 645), (41, 'PR', 'Paraná', 4, 399),
+    (42, 'SC', 'Santa Catarina', 4, 295), (43, 'RS', 'Rio Grande do Sul', 4, 497),
+    (50, 'MS', 'Mato Grosso do Sul', 5, 79), (51, 'MT', 'Mato Grosso', 5, 141), (52, 'GO', 'Goiás', 5, 246),
+    (53, 'DF', 'Distrito Federal', 5, 1),
+]
+
+PLACE_PREFIXES = ['São', 'Santa', 'Santo', 'Nova', 'Porto', 'Bom Jesus', 'Campo', 'Vila', 'Monte', 'Barra', 'Ribeirão', 'Lagoa', '', '', '']
+PLACE_NAMES = [
+    'José', 'João', 'Antônio', 'Luzia', 'Cruz', 'Esperança', 'Alegre', 'Paraíso', 'Araçá', 'Itaúna',
+    'Caçapava', 'Conceição', 'Jacarandá', 'Guaçu', 'Piraí', 'Tabuleiro', 'Floresta', 'Itapuã', 'Jaú', 'Açaí',
+]
+PLACE_SUFFIXES = ['do Sul', 'do Norte', 'da Serra', 'das Flores', 'do Oeste', 'dos Campos', 'Velho', '', '', '', '']
+
+ACTIVITIES = [
+    'COMÉRCIO DE ALIMENTOS', 'INDÚSTRIA E COMÉRCIO', 'CONSTRUÇÕES', 'SERVIÇOS MÉDICOS', 'TRANSPORTES',
+    'AGROPECUÁRIA', 'CONFECÇÕES', 'PANIFICAÇÃO', 'DISTRIBUIDORA DE BEBIDAS', 'FARMÁCIA', 'AUTO PEÇAS',
+    'ASSOCIAÇÃO DE MORADORES', 'TECNOLOGIA DA INFORMAÇÃO', 'MATERIAIS DE CONSTRUÇÃO', 'SALÃO DE BELEZA',
+]
+FIRST_NAMES = ['MARIA', 'JOSÉ', 'JOÃO', 'ANA', 'ANTÔNIO', 'FRANCISCO', 'LUCIANA', 'MÁRCIO', 'SÉRGIO', 'ADRIANA', 'CONCEIÇÃO', 'INÊS']
+SURNAMES = [
+    'DA SILVA', 'DOS SANTOS', 'DE OLIVEIRA', 'GONÇALVES', 'ARAÚJO', 'SIMÕES', 'MAGALHÃES', 'FALCÃO',
+    'BRAGANÇA', 'DE SOUZA', 'PEREIRA', 'LIMA', 'RIBEIRO', 'CONCEIÇÃO', 'DE ASSUNÇÃO',
+]
+# (natureza_juridica, qualificacao_responsavel, razão social suffix, weight), roughly the mix of the Receita files.
+LEGAL_NATURES = [
+    ('2135', '50', '', 45),        # Empresário individual (MEIs)
+    ('2062', '49', ' LTDA', 35),   # Sociedade empresária limitada
+    ('2305', '65', ' EIRELI', 6),  # EIRELI
+    ('3999', '16', '', 6),         # Associação privada
+    ('2240', '49', ' SS', 4),      # Sociedade simples
+    ('2046', '10', ' S.A.', 2),    # Sociedade anônima fechada
+    ('1244', '05', '', 2),         # Município
+]
+NATURE_WEIGHTS = [nature[3] for nature in LEGAL_NATURES]
+SIZES = ['01', '01', '01', '03', '05', '00', '']
+
+
+def place_name(rng:random.Random) -> str:
+    return ' '.join(part for part in (rng.choice(PLACE_PREFIXES), rng.choice(PLACE_NAMES), rng.choice(PLACE_SUFFIXES)) if part)
+
+
+def person_name(rng:random.Random) -> str:
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)} {rng.choice(SURNAMES)}'
+
+
+def company_line(cnpj:int, rng:random.Random) -> str:
+    """One EMPRECSV line: `;`-separated, double-quoted, capital_social with a decimal comma."""
+    natureza, qualificacao, suffix, _ = rng.choices(LEGAL_NATURES, weights=NATURE_WEIGHTS)[0]
+    cnpj = f'{cnpj:08d}'
+    ente = ''
+    if natureza == '2135':
+        # MEIs are named after the formatted CNPJ and the owner, and usually declare a small capital.
+        razao_social = f'{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:]} {person_name(rng)}'
+        cents = rng.randint(0, 5000000)
+    elif natureza == '1244':
+        state = rng.choice(STATES)
+        ente = f'{place_name(rng).upper()} - {state[1]}'
+        razao_social = f'MUNICIPIO DE {ente[:-5]}'
+        cents = 0
+    else:
+        razao_social = f'{rng.choice(ACTIVITIES)} {rng.choice(SURNAMES)}{suffix}'
+        cents = 0 if rng.random() < 0.2 else int(rng.lognormvariate(11, 2.5)) * 100
+    capital = f'{cents // 100},{cents % 100:02d}'
+    return f'"{cnpj}";"{razao_social}";"{natureza}";"{qualificacao}";"{capital}";"{rng.choice(SIZES)}";"{ente}"\n'
+
+
+def generate_company_archives(directory:str, rows:int, archives:int=1, seed:int=DEFAULT_SEED) -> List[str]:
+    """
+    Writes `rows` synthetic companies split over `archives` Receita-format ZIPs
+    (Empresas0.zip, ... each holding a latin-1 `EMPRECSV` member) and returns their paths.
+    The output only depends on the arguments, so archives already in `directory` are reused.
+    """
+    os.makedirs(directory, exist_ok=True)
+    per_archive = -(-rows // archives)
+    paths = []
+    for index in range(archives):
+        path = os.path.join(directory, f'Empresas{index}.zip')
+        paths.append(path)
+        first, last = index * per_archive, min(rows, (index + 1) * per_archive)
+        if os.path.exists(path):
+            continue
+        rng = random.Random(f'{seed}-{index}')
+        partial = f'{path}.partial'
+        with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f'K3241.K03200Y{index}.D50510.EMPRECSV', 'w', force_zip64=True) as member:
+                for start in range(first, last, GENERATOR_CHUNK_ROWS):
+                    lines = ''.join(company_line(cnpj, rng) for cnpj in range(start, min(last, start + GENERATOR_CHUNK_ROWS)))
+                    member.write(lines.encode('latin-1'))
+        os.replace(partial, path)
+        logger.info(f"Generated {path} with {last - first} companies.")
+    return paths
+
+
+class IBGEFixtures:
+    """
+    IBGE-shaped payloads for the 27 real states and 5,570 synthetic municipalities with about
+    two districts each, nested the way the localities API nests them, keyed by endpoint.
+    """
+
+    def __init__(self, seed:int=DEFAULT_SEED):
+        rng = random.Random(seed)
+        regions = {id: {'id': id, 'sigla': sigla, 'nome': nome} for id, sigla, nome in REGIONS}
+        states = {
+            id: {'id': id, 'sigla': sigla, 'nome': nome, 'regiao': regions[region_id]}
+            for id, sigla, nome, region_id, _ in STATES
+        }
+        municipalities = {id: [] for id in states}
+        districts = {id: [] for id in states}
+        for state_id, _, _, _, count in STATES:
+            state = states[state_id]
+            for index in range(count):
+                municipality = self.municipality(rng, state, state_id * 100000 + index * 10)
+                municipalities[state_id].append(municipality)
+                for district in range(1 + rng.choice([0, 0, 1, 1, 2, 3])):
+                    name = municipality['nome'] if district == 0 else place_name(rng)
+                    districts[state_id].append({'id': municipality['id'] * 100 + 5 + district, 'nome': name, 'municipio': municipality})
+
+        self.bodies:Dict[str, bytes] = {'estados': self.encode(states.values())}
+        self.bodies['municipios'] = self.encode(municipality for shard in municipalities.values() for municipality in shard)
+        self.bodies['distritos'] = self.encode(district for shard in districts.values() for district in shard)
+        for state_id in states:
+            self.bodies[f'estados/{state_id}/municipios'] = self.encode(municipalities[state_id])
+            self.bodies[f'estados/{state_id}/distritos'] = self.encode(districts[state_id])
+        self.counts = {
+            'states': len(states),
+            'municipalities': sum(map(len, municipalities.values())),
+            'districts': sum(map(len, districts.values())),
+        }
+
+    @staticmethod
+    def municipality(rng:random.Random, state:dict, id:int) -> dict:
+        name = place_name(rng)
+        mesorregiao = {'id': state['id'] * 100 + rng.randint(1, 9), 'nome': place_name(rng), 'UF': state}
+        municipality = {
+            'id': id,
+            'nome': name,
+            'microrregiao': {'id': mesorregiao['id'] * 10 + rng.randint(1, 9), 'nome': name, 'mesorregiao': mesorregiao},
+            'regiao-imediata': {
+                'id': state['id'] * 10000 + rng.randint(1, 99),
+                'nome': name,
+                'regiao-intermediaria': {'id': state['id'] * 100 + rng.randint(1, 9), 'nome': place_name(rng), 'UF': state},
+            },
+        }
+        # A few municipalities are no longer assigned to a microrregiao, as in the real API.
+        if rng.random() < 0.01:
+            municipality['microrregiao'] = None
+        return municipality
+
+    @staticmethod
+    def encode(items) -> bytes:
+        return json.dumps(sorted(items, key=lambda item: item['nome']), ensure_ascii=False).encode()
+
+
+class IBGEStubServer:
+    """
+    Local HTTP server answering the localities endpoints used by IBGEApiClient
+    (`estados`, `municipios`, `distritos` and their per-UF shards) from IBGEFixtures,
+    with ETags so revalidation can be exercised. Use as a context manager; `url` is its base URL.
+    The first `failures` requests to every endpoint are answered with a 503, to exercise the
+    client's retries; `requests` holds the time.monotonic() of every request, per endpoint.
+    """
+
+    def __init__(self, fixtures:IBGEFixtures, host:str='127.0.0.1', port:int=0, failures:int=0):
+        bodies = fixtures.bodies
+        self.requests:Dict[str, List[float]] = {}
+        requests, lock = self.requests, threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_empty(self, status:int):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                endpoint = urlparse(self.path).path.strip('/')
+                with lock:
+                    calls = requests.setdefault(endpoint, [])
+                    calls.append(time.monotonic())
+                    failing = len(calls) <= failures
+                if failing:
+                    self.send_empty(503)
+                    return
+                body = bodies.get(endpoint)
+                if body is None:
+                    self.send_empty(404)
+                    return
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json;charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread:Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
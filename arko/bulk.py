@@ -0,0 +1,162 @@
+import logging
+import re
+import zipfile
+from typing import List, Tuple
+from django.db import connection, transaction
+
+from .models import DroppedIndex
+from .readers import find_csv_member
+
+logger = logging.getLogger(__name__)
+
+# A load that writes at least this fraction of the rows already stored is treated as a rewrite.
+BULK_REWRITE_RATIO = 0.5
+DEFAULT_MAINTENANCE_WORK_MEM = '1GB'
+LINE_SAMPLE_BYTES = 1024 * 1024
+MAINTENANCE_WORK_MEM_PATTERN = r'\d+\s*(kB|MB|GB|TB)?'
+
+
+def estimate_archive_rows(archives:List[str], marker:str) -> int:
+    """
+    Estimates the rows of the CSV members from their uncompressed size and the
+    average line length of their first megabyte, without decompressing the rest.
+    """
+    total = 0
+    for archive in archives:
+        with zipfile.ZipFile(archive, 'r') as zf:
+            member = zf.getinfo(find_csv_member(zf, marker))
+            with zf.open(member, 'r') as csv_file:
+                sample = csv_file.read(LINE_SAMPLE_BYTES)
+        lines = sample.count(b'\n') or 1
+        total+=int(member.file_size / (len(sample) / lines)) if sample else 0
+    return total
+
+
+class InvalidIndexError(Exception):
+    """Raised when a rebuilt index is left INVALID by Postgres and cannot be used by queries."""
+
+
+class SecondaryIndexes:
+    """
+    The indexes of a table that no constraint depends on (db_index, Meta.indexes, the
+    varchar_pattern_ops copies...). The primary key and unique constraints are kept,
+    since the loaders merge with ON CONFLICT on them. The definitions of the dropped
+    indexes are kept in DroppedIndex until they are rebuilt, so a killed load can be
+    repaired by the next one (see restore).
+    """
+
+    def __init__(self, table:str, db_connection=None):
+        self.table = table
+        self.connection = db_connection or connection
+        self.definitions: List[Tuple[str, str]] = []
+
+    def _quote(self, name:str) -> str:
+        return self.connection.ops.quote_name(name)
+
+    def estimated_rows(self) -> int:
+        """Planner row estimate, falling back to count(*) for tables that were never analyzed."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [self.table])
+            estimate = cursor.fetchone()[0]
+            if estimate < 0:
+                cursor.execute(f"SELECT count(*) FROM {self._quote(self.table)}")
+                estimate = cursor.fetchone()[0]
+        return estimate
+
+    def find(self) -> List[Tuple[str, str]]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT i.relname, pg_get_indexdef(i.oid)
+                FROM pg_index x
+                JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass
+                  AND NOT x.indisprimary
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+                ORDER BY i.relname
+                """,
+                [self.table]
+            )
+            return cursor.fetchall()
+
+    def drop(self):
+        """Drops the secondary indexes, after saving their definitions to rebuild them later."""
+        self.definitions = self.find()
+        with transaction.atomic(using=self.connection.alias):
+            DroppedIndex.objects.using(self.connection.alias).filter(name__in=[name for name, _ in self.definitions]).delete()
+            DroppedIndex.objects.using(self.connection.alias).bulk_create(
+                DroppedIndex(table=self.table, name=name, definition=definition) for name, definition in self.definitions
+            )
+        with self.connection.cursor() as cursor:
+            for name, definition in self.definitions:
+                logger.info(f"Dropping index {name}: {definition}")
+                cursor.execute(f"DROP INDEX IF EXISTS {self._quote(name)}")
+        logger.info(f"Dropped {len(self.definitions)} secondary index(es) of {self.table} for the bulk load.")
+
+    def rebuild(self, maintenance_work_mem:str=DEFAULT_MAINTENANCE_WORK_MEM):
+        """
+        Recreates the dropped indexes with CREATE INDEX CONCURRENTLY, so the table stays
+        readable while they build, then refreshes the planner statistics with ANALYZE.
+        Must run outside a transaction.
+        """
+        if not re.fullmatch(MAINTENANCE_WORK_MEM_PATTERN, maintenance_work_mem.strip()):
+            raise ValueError(f"Invalid maintenance_work_mem: {maintenance_work_mem}")
+
+        names = [name for name, _ in self.definitions]
+        with self.connection.cursor() as cursor:
+            # An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which IF NOT EXISTS would keep.
+            for name in self.invalid(names):
+                logger.warning(f"Dropping invalid index {name} left by an interrupted build.")
+                cursor.execute(f"DROP INDEX IF EXISTS {self._quote(name)}")
+            cursor.execute(f"SET maintenance_work_mem = '{maintenance_work_mem.strip()}'")
+            try:
+                for name, definition in self.definitions:
+                    concurrent = re.sub(
+                        r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX CONCURRENTLY IF NOT EXISTS ', definition
+                    )
+                    logger.info(f"Rebuilding index {name}...")
+                    cursor.execute(concurrent)
+            finally:
+                cursor.execute("RESET maintenance_work_mem")
+            cursor.execute(f"ANALYZE {self._quote(self.table)}")
+
+        invalid = self.invalid(names)
+        if invalid:
+            raise InvalidIndexError(
+                f"Index(es) {', '.join(invalid)} of {self.table} are INVALID after the rebuild; "
+                f"the next import retries them, or drop and recreate them by hand: " + '; '.join(definition for name, definition in self.definitions if name in invalid)
+            )
+        DroppedIndex.objects.using(self.connection.alias).filter(table=self.table, name__in=names).delete()
+        logger.info(f"Rebuilt {len(self.definitions)} index(es) and analyzed {self.table}.")
+
+    def restore(self, maintenance_work_mem:str=DEFAULT_MAINTENANCE_WORK_MEM) -> bool:
+        """
+        Rebuilds the indexes that an earlier bulk load dropped and never rebuilt, because the
+        process was killed or the rebuild failed. Indexes that are still there and valid are
+        left as they are. Returns whether there was anything to restore.
+        """
+        self.definitions = list(
+            DroppedIndex.objects.using(self.connection.alias).filter(table=self.table).values_list('name', 'definition')
+        )
+        if not self.definitions:
+            return False
+        logger.warning(f"Restoring {len(self.definitions)} index(es) of {self.table} dropped by an unfinished bulk load...")
+        self.rebuild(maintenance_work_mem)
+        return True
+
+    def invalid(self, names:List[str]) -> List[str]:
+        """The indexes among `names` that Postgres marks as not valid (pg_index.indisvalid)."""
+        if not names:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT i.relname
+                FROM pg_index x
+                JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass AND NOT x.indisvalid AND i.relname = ANY(%s)
+                ORDER BY i.relname
+                """,
+                [self.table, names]
+            )
+            return [name for name, in cursor.fetchall()]
@@ -0,0 +1,57 @@
+import hashlib
+import logging
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# Entries are keyed by the data version, so they never go stale; the timeout only frees old versions.
+CACHE_TIMEOUT = 24 * 60 * 60 ## seconds
+
+
+def normalized_querystring(query_dict) -> str:
+    """The filters and page of a request, sorted and without empty values, so equivalent URLs share an entry."""
+    return urlencode(sorted((key, value) for key, values in query_dict.lists() for value in values if value))
+
+
+class DataVersionCacheMixin:
+    """
+    Caches the rendered GET responses of a view over data that only changes on import.
+
+    The cache key, the ETag and Last-Modified all derive from the `data_version` the import
+    command bumps, so the cache is invalidated exactly when the data changes, and a browser
+    revalidating a page it already has gets a 304 without any filter query or template render.
+    Responses are marked private: the views are behind the login.
+    """
+    data_version = None
+    cache_timeout = CACHE_TIMEOUT
+
+    def get(self, request, *args, **kwargs):
+        version = DataVersion.current(self.data_version)
+        querystring = normalized_querystring(request.GET)
+        digest = hashlib.sha1(querystring.encode()).hexdigest()[:16]
+        etag = quote_etag(f'{self.data_version}-{version.version}-{digest}')
+        last_modified = int(version.updated_at.timestamp()) if version.updated_at else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = f'arko:{self.__class__.__name__}:{self.data_version}:{version.version}:{digest}'
+            content = cache.get(key)
+            if content is None:
+                response = super().get(request, *args, **kwargs)
+                response.render()
+                if response.status_code == 200:
+                    cache.set(key, response.content, self.cache_timeout)
+            else:
+                response = HttpResponse(content)
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
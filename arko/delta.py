@@ -0,0 +1,54 @@
+import itertools
+import logging
+from typing import Iterator, List
+import numpy as np
+import pandas as pd
+
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+CNPJ_BASE_VALUES = 10 ** 8
+MISSING_SCAN_BATCH = 100000
+
+
+class CnpjSet:
+    """
+    Bitmap over every possible 8-digit CNPJ básico (12.5 MB), used to remember
+    which companies an import has seen without holding tens of millions of strings.
+    """
+
+    def __init__(self):
+        self.bits = np.zeros(CNPJ_BASE_VALUES // 8, dtype=np.uint8)
+
+    @staticmethod
+    def _to_numbers(cnpjs:pd.Series) -> np.ndarray:
+        return pd.to_numeric(cnpjs, errors='coerce').to_numpy()
+
+    def add(self, cnpjs:pd.Series):
+        numbers = self._to_numbers(cnpjs)
+        numbers = numbers[~np.isnan(numbers)].astype('int64')
+        np.bitwise_or.at(self.bits, numbers >> 3, (1 << (numbers & 7)).astype(np.uint8))
+
+    def contains(self, cnpjs:pd.Series) -> np.ndarray:
+        """Vectorized membership test. Values that are not 8-digit numbers are never members."""
+        numbers = self._to_numbers(cnpjs)
+        valid = ~np.isnan(numbers) & (numbers >= 0) & (numbers < CNPJ_BASE_VALUES)
+        safe = np.where(valid, numbers, 0).astype('int64')
+        return valid & ((self.bits[safe >> 3] >> (safe & 7)) & 1).astype(bool)
+
+    def update(self, other:'CnpjSet'):
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+
+
+def iter_missing_cnpjs(seen:CnpjSet, batch_size:int=MISSING_SCAN_BATCH) -> Iterator[List[str]]:
+    """Streams the Company table and yields, in batches, the cnpjs that were not seen by the import."""
+    cnpjs = Company.objects.order_by().values_list('cnpj', flat=True).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(itertools.islice(cnpjs, batch_size))
+        if not batch:
+            return
+        values = pd.Series(batch)
+        missing = values[~seen.contains(values)]
+        if not missing.empty:
+            yield missing.tolist()
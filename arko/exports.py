@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import logging
+import tempfile
+from functools import partial
+from typing import AsyncIterator, Iterator, List
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = [
+    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
+]
+# Rows fetched per round trip of the server-side cursor, and written per chunk of the response.
+EXPORT_CHUNK_SIZE = 5000
+CSV_DELIMITER = ';'
+# The XLSX is built whole before the download starts, at roughly 7,000 rows per second, so
+# larger exports are refused and left to CSV and JSON Lines, which stream. A sheet holds
+# 1,048,576 rows.
+XLSX_MAX_ROWS = 100000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Bytes of the finished XLSX file sent per chunk when streaming it asynchronously.
+XLSX_BLOCK_SIZE = 1024 * 1024
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FORMAT_XLSX = 'xlsx'
+EXPORT_FORMATS = [FORMAT_CSV, FORMAT_JSONL, FORMAT_XLSX]
+
+
+def iter_row_chunks(queryset:QuerySet, fields:List[str]) -> Iterator[List[tuple]]:
+    """
+    Reads the queryset through a server-side cursor, EXPORT_CHUNK_SIZE rows at a time,
+    so only one chunk is ever held in memory. The cursor is opened inside a transaction:
+    in autocommit mode Django declares it WITH HOLD, which makes Postgres materialize the
+    whole result before returning the first row.
+    """
+    with transaction.atomic(using=queryset.db):
+        chunk = []
+        for row in queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == EXPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def stream_csv(queryset:QuerySet, fields:List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=CSV_DELIMITER)
+    writer.writerow(fields)
+    for chunk in iter_row_chunks(queryset, fields):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(queryset:QuerySet, fields:List[str]) -> Iterator[str]:
+    for chunk in iter_row_chunks(queryset, fields):
+        # Decimals are written as strings to keep every digit of capital_social.
+        yield ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n' for row in chunk)
+
+
+def write_xlsx(queryset:QuerySet, fields:List[str]):
+    """
+    Writes the rows to a single sheet with openpyxl's write-only mode, which streams them to
+    a temporary file instead of keeping the sheet in memory, and returns that file. The ZIP
+    container can only be produced once the last row is written, so unlike CSV and JSON Lines
+    the download starts after the query finished; callers cap the rows at XLSX_MAX_ROWS.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Empresas')
+    sheet.append(fields)
+    for chunk in iter_row_chunks(queryset, fields):
+        for row in chunk:
+            sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+_EXHAUSTED = object()
+
+
+async def aiterate(iterator:Iterator) -> AsyncIterator:
+    """
+    Async iterator over a sync one, advanced one item at a time by sync_to_async. Under ASGI,
+    Django reads a sync streaming body with sync_to_async(list), holding all of it in memory.
+    Each step instead runs on the request's sync thread, the one that owns the server-side
+    cursor, and the iterator is closed there too.
+    """
+    try:
+        while True:
+            item = await sync_to_async(next)(iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def export_response(queryset:QuerySet, export_format:str, filename:str, fields:List[str]=EXPORT_FIELDS, asynchronous:bool=False):
+    """
+    Response streaming the queryset in `export_format`, with memory bounded by one chunk of rows.
+    Pass `asynchronous` when the request is served under ASGI, so the body is an async iterator.
+    """
+    if export_format == FORMAT_XLSX:
+        output = write_xlsx(queryset, fields)
+        response = FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE)
+        if asynchronous:
+            response.streaming_content = aiterate(iter(partial(output.read, XLSX_BLOCK_SIZE), b''))
+        return response
+
+    if export_format == FORMAT_JSONL:
+        content, content_type = stream_jsonl(queryset, fields), 'application/x-ndjson; charset=utf-8'
+    else:
+        content, content_type = stream_csv(queryset, fields), 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(aiterate(content) if asynchronous else content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
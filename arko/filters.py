@@ -1,26 +1,48 @@
 import django_filters
 from .models import Company, Municipality, District, Region, State
+from .lookups import reference
+from .search import RELEVANCE_FIELD, search_by_name
+from .widgets import AutocompleteWidget
 
 class CompanyFilter(django_filters.FilterSet):
-    razao_social=django_filters.CharFilter(lookup_expr='icontains', label='Razão Social')
+    # Ordered by CompanyListView, which only ranks by relevance when the matches are few enough.
+    razao_social=django_filters.CharFilter(method='search_razao_social', label='Razão Social')
 
     class Meta:
         model = Company
-        fields = ['razao_social', 'natureza_juridica', 'porte_empresa']
+        fields = ['razao_social', 'natureza_juridica', 'porte_empresa', 'qualificacao_responsavel']
+
+    def search_razao_social(self, queryset, name, value):
+        return search_by_name(queryset, 'razao_social_normalizada', value)
 
 class MunicipalityFilter(django_filters.FilterSet):
-    nome = django_filters.CharFilter(lookup_expr='icontains', label='Nome do Município')
+    nome = django_filters.CharFilter(method='search_nome', label='Nome do Município')
+    # Choices from the in-memory lookups (see arko.lookups), instead of a query per render.
+    estado = django_filters.TypedChoiceFilter(field_name='estado_id', choices=lambda: reference('states'), coerce=int, label='Estado')
 
     class Meta:
         model = Municipality
         fields = ['nome', 'estado']
 
+    def search_nome(self, queryset, name, value):
+        return search_by_name(queryset, 'nome_normalizado', value).order_by(f'-{RELEVANCE_FIELD}', 'nome')
+
 class DistrictFilter(django_filters.FilterSet):
-    nome = django_filters.CharFilter(lookup_expr='icontains', label='Nome do Distrito')
+    nome = django_filters.CharFilter(method='search_nome', label='Nome do Distrito')
+    # An id picked through the autocomplete endpoint, so the page does not ship every municipality.
+    municipio = django_filters.NumberFilter(
+        field_name='municipio_id', label='Município',
+        widget=AutocompleteWidget('arko:municipality-autocomplete', 'municipalities', forward=['estado'])
+    )
+    estado = django_filters.TypedChoiceFilter(field_name='estado_id', choices=lambda: reference('states'), coerce=int, label='Estado')
+    regiao = django_filters.TypedChoiceFilter(field_name='regiao_id', choices=lambda: reference('regions'), coerce=int, label='Região')
 
     class Meta:
         model = District
-        fields = ['nome', 'municipio']
+        fields = ['nome', 'municipio', 'estado', 'regiao']
+
+    def search_nome(self, queryset, name, value):
+        return search_by_name(queryset, 'nome_normalizado', value).order_by(f'-{RELEVANCE_FIELD}', 'nome')
 
 class StateFilter(django_filters.FilterSet):
     nome = django_filters.CharFilter(lookup_expr='icontains', label='Nome do estado')
@@ -0,0 +1,510 @@
+import contextlib
+import glob
+import hashlib
+import io
+import itertools
+import logging
+import os
+import time
+import zipfile
+from decimal import Decimal
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+import pandas as pd
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from .delta import CnpjSet
+from .loaders import CompanyCopyLoader, EstablishmentCopyLoader
+from .metrics import ImportMetrics, TimedStream
+from .models import Company, Establishment, ImportCheckpoint
+from .readers import DEFAULT_MEMORY_BUDGET, ReceitaCsvReader, find_csv_member
+from .resolvers import MunicipalityResolver
+from .routers import use_primary
+from .snapshots import ColumnarSnapshot, SnapshotWriter
+from .transforms import FINGERPRINT_COLUMN, TransformedBatch, transform_chunk, transform_establishments
+
+logger = logging.getLogger(__name__)
+
+COLUMN_NAMES = [
+    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
+]
+ESTABLISHMENT_COLUMN_NAMES = [
+    'cnpj_basico', 'cnpj_ordem', 'cnpj_dv', 'identificador_matriz_filial', 'nome_fantasia',
+    'situacao_cadastral', 'data_situacao_cadastral', 'motivo_situacao_cadastral', 'nome_cidade_exterior',
+    'pais', 'data_inicio_atividade', 'cnae_fiscal_principal', 'cnae_fiscal_secundaria', 'tipo_logradouro',
+    'logradouro', 'numero', 'complemento', 'bairro', 'cep', 'uf', 'codigo_municipio', 'ddd_1', 'telefone_1',
+    'ddd_2', 'telefone_2', 'ddd_fax', 'fax', 'correio_eletronico', 'situacao_especial', 'data_situacao_especial'
+]
+CHUNK_SIZE = 50000
+COMPANIES_CSV_MARKER = 'EMPRECSV'
+ESTABLISHMENTS_CSV_MARKER = 'ESTABELE'
+
+LOADER_ORM = 'orm'
+LOADER_COPY = 'copy'
+LOADERS = [LOADER_ORM, LOADER_COPY]
+
+READER_PANDAS = 'pandas'
+READER_STREAM = 'stream'
+READERS = [READER_PANDAS, READER_STREAM]
+# Buffer width of capital_social, which has no max_length: 14 integer digits, separators and decimals.
+CAPITAL_TEXT_WIDTH = 32
+# Buffer widths of the Estabelecimentos fields that are not model columns as such.
+ESTABLISHMENT_RAW_WIDTHS = {
+    'cnpj_basico': 9, 'cnpj_ordem': 5, 'cnpj_dv': 3, 'data_situacao_cadastral': 9, 'data_inicio_atividade': 9,
+}
+
+CSV_OPTIONS = {
+    'header': None,
+    'sep': ';',
+    'encoding': 'latin-1',
+    'dtype': str,
+}
+
+
+class ArchiveImportError(Exception):
+    """Raised by pool workers with a plain message, so the error always pickles back to the parent."""
+
+
+class ArchiveResult(NamedTuple):
+    archive: str
+    rows: int
+    rejected: int
+    elapsed: float
+    inserted: int = 0
+    updated: int = 0
+    seen: Optional[CnpjSet] = None
+    metrics: Optional[ImportMetrics] = None
+
+
+def find_archives(path:str) -> List[str]:
+    """Resolves a ZIP path, a directory of ZIPs or a glob pattern into a sorted list of archives."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.zip')))
+    if glob.has_magic(path):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+def rejects_file_for(rejects_file:Optional[str], archive:str) -> Optional[str]:
+    """Derives a per-archive rejects file, so parallel workers never append to the same file."""
+    if not rejects_file:
+        return None
+    base, extension = os.path.splitext(rejects_file)
+    archive_name = os.path.splitext(os.path.basename(archive))[0]
+    return f"{base}-{archive_name}{extension or '.csv'}"
+
+
+def company_column_widths() -> dict:
+    """Streaming reader buffer widths: one byte over each max_length, so overlong values still fail validation."""
+    widths = {}
+    for column in COLUMN_NAMES:
+        max_length = Company._meta.get_field(column).max_length
+        widths[column] = max_length + 1 if max_length else CAPITAL_TEXT_WIDTH
+    return widths
+
+
+def establishment_column_widths() -> dict:
+    """
+    Streaming reader buffer widths for Estabelecimentos. Fields the model does not store
+    (phones, e-mail, secondary CNAEs...) only keep their first byte, also in the rejects file.
+    """
+    fields = {field.column: field for field in Establishment._meta.concrete_fields}
+    widths = {}
+    for column in ESTABLISHMENT_COLUMN_NAMES:
+        field = fields.get(column)
+        if column in ESTABLISHMENT_RAW_WIDTHS:
+            widths[column] = ESTABLISHMENT_RAW_WIDTHS[column]
+        elif field is not None and field.max_length:
+            widths[column] = field.max_length + 1
+        else:
+            widths[column] = 1
+    return widths
+
+
+def iter_raw_chunks(stream, chunk_size:int, offset:int=0) -> Iterator[Tuple[bytes, int]]:
+    """
+    Yields the raw bytes of every `chunk_size` lines of an uncompressed CSV stream,
+    with the byte offset right after each chunk. Starting at `offset` only decompresses
+    the skipped part of the member; it is never parsed.
+    """
+    if offset:
+        stream.seek(offset)
+    while True:
+        lines = list(itertools.islice(stream, chunk_size))
+        if not lines:
+            return
+        data = b''.join(lines)
+        offset += len(data)
+        yield data, offset
+
+
+class ReceitaArchiveImporter:
+    """
+    Imports one Receita ZIP: reads the CSV member in chunks, transforms each chunk
+    column-wise and hands the valid rows to the selected loader.
+    With `checkpoint`, every chunk is committed on its own and recorded as an ImportCheckpoint,
+    and `resume` continues after the last recorded chunk of the same archive.
+    The 'stream' reader parses with ReceitaCsvReader in batches sized by `memory_budget`
+    instead of pandas chunks of `chunk_size` rows.
+    With `snapshot_dir`, the parsed columns are also written to a ColumnarSnapshot keyed by the
+    CSV member's CRC, and later imports of the same file read that snapshot instead of the ZIP.
+    Every stage (decompress, parse, transform, db_write, commit) is timed into `metrics`.
+
+    Subclasses describe the file (`csv_marker`, `column_names`, `column_widths`),
+    the `transform` and the two loaders (`copy_loader` and `upsert_with_orm`).
+    """
+    command = None
+    entity = None
+    csv_marker = None
+    column_names = []
+
+    def __init__(self, loader:str=LOADER_ORM, rejects_file:Optional[str]=None, chunk_size:int=CHUNK_SIZE,
+                 progress=None, checkpoint:bool=False, resume:bool=False,
+                 reader:str=READER_PANDAS, memory_budget:int=DEFAULT_MEMORY_BUDGET,
+                 metrics:Optional[ImportMetrics]=None, trace_memory:bool=False, snapshot_dir:Optional[str]=None):
+        self.loader = loader
+        self.snapshot_dir = snapshot_dir
+        self.reader = reader
+        self.memory_budget = memory_budget
+        self.rejects_file = rejects_file
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.checkpoint = checkpoint or resume
+        self.resume = resume
+        self.rejected_rows = 0
+        self.loaded_rows = 0
+        self.metrics = metrics or ImportMetrics(self.command, trace_memory=trace_memory)
+
+    def csv_options(self) -> dict:
+        return {**CSV_OPTIONS, 'names': self.column_names}
+
+    def column_widths(self) -> dict:
+        raise NotImplementedError
+
+    def transform(self, chunk:pd.DataFrame) -> TransformedBatch:
+        raise NotImplementedError
+
+    def copy_loader(self):
+        raise NotImplementedError
+
+    def upsert_with_orm(self, rows:pd.DataFrame):
+        raise NotImplementedError
+
+    def import_archive(self, zip_file_path:str) -> ArchiveResult:
+        started = time.monotonic()
+        logger.info(f"Starting {self.entity} data import from {zip_file_path} using the '{self.loader}' loader...")
+
+        with zipfile.ZipFile(zip_file_path, 'r') as zf, contextlib.ExitStack() as stack:
+            csv_filename = find_csv_member(zf, self.csv_marker)
+            member = zf.getinfo(csv_filename)
+            logger.info(f"Found CSV file in ZIP: {csv_filename}")
+
+            copy_loader = None
+            if self.loader == LOADER_COPY:
+                copy_loader = stack.enter_context(self.copy_loader())
+                load_rows = copy_loader.load
+            else:
+                load_rows = self.upsert_with_orm
+
+            snapshot = None
+            if self.snapshot_dir and not self.checkpoint:
+                snapshot = ColumnarSnapshot.for_member(self.snapshot_dir, zip_file_path, member, self.column_names)
+
+            if snapshot is not None:
+                logger.info(f"Reading {snapshot.rows} rows from the snapshot {snapshot.path} instead of the CSV.")
+                chunks = self.timed_chunks(snapshot.iter_chunks(self.chunk_size), 'snapshot_read')
+                rows = self.process_chunks(zip_file_path, chunks, load_rows)
+            else:
+                member_file = stack.enter_context(zf.open(csv_filename, 'r'))
+                csv_file = TimedStream(member_file, self.metrics, 'decompress')
+
+                stream_reader = None
+                if self.reader == READER_STREAM:
+                    stream_reader = ReceitaCsvReader(csv_file, self.column_names, self.column_widths(), self.memory_budget)
+
+                if self.checkpoint:
+                    rows = self.process_checkpointed_chunks(zip_file_path, member, csv_file, load_rows, stream_reader)
+                else:
+                    csv_reader = stream_reader or pd.read_csv(csv_file, chunksize=self.chunk_size, **self.csv_options())
+                    if self.snapshot_dir:
+                        writer = stack.enter_context(SnapshotWriter(self.snapshot_dir, zip_file_path, member, self.column_names))
+                        csv_reader = self.record_snapshot(csv_reader, writer)
+                    rows = self.process_chunks(zip_file_path, csv_reader, load_rows)
+
+        self.finish_archive(zip_file_path, copy_loader)
+        if self.rejected_rows:
+            logger.warning(f"{self.rejected_rows} rows of {zip_file_path} were rejected by validation.")
+        return self.result(zip_file_path, rows, time.monotonic() - started)
+
+    def finish_archive(self, archive:str, copy_loader):
+        """Hook run once the whole archive was loaded."""
+
+    def timed_chunks(self, chunks:Iterator[pd.DataFrame], stage_name:str) -> Iterator[pd.DataFrame]:
+        chunks = iter(chunks)
+        while True:
+            with self.metrics.stage(stage_name):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def record_snapshot(self, chunks:Iterator[pd.DataFrame], writer:SnapshotWriter) -> Iterator[pd.DataFrame]:
+        """Passes the parsed chunks through, appending each one to the snapshot being written."""
+        for chunk in chunks:
+            with self.metrics.stage('snapshot_write'):
+                writer.append(chunk)
+            yield chunk
+
+    def result(self, archive:str, rows:int, elapsed:float) -> ArchiveResult:
+        return ArchiveResult(archive, rows, self.rejected_rows, elapsed, metrics=self.metrics)
+
+    def process_chunks(self, archive:str, csv_reader, load_rows) -> int:
+        """Transforms every chunk of the CSV reader and feeds the valid rows to the given loader function."""
+        total_rows_processed = 0
+        chunks = iter(csv_reader)
+
+        for i in itertools.count():
+            chunk_started = time.perf_counter()
+            with self.metrics.stage('parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            batch = self.load_chunk(chunk, load_rows)
+            self.write_rejects(batch)
+            total_rows_processed+=len(chunk)
+            self.report_progress(archive, i, total_rows_processed, len(chunk), time.perf_counter() - chunk_started)
+
+        return total_rows_processed
+
+    def process_checkpointed_chunks(self, archive:str, member:zipfile.ZipInfo, csv_file, load_rows,
+                                    stream_reader:Optional[ReceitaCsvReader]=None) -> int:
+        """
+        Commits every chunk together with its checkpoint, so a failure only loses the chunk in flight.
+        On resume, the stream is positioned at the end offset of the last checkpoint.
+        """
+        key = {'archive': os.path.basename(archive), 'csv_member': member.filename, 'member_crc': member.CRC}
+        checkpoints = ImportCheckpoint.objects.filter(**key)
+
+        last_checkpoint = checkpoints.order_by('-chunk_index').first() if self.resume else None
+        if last_checkpoint:
+            start_index = last_checkpoint.chunk_index + 1
+            offset = last_checkpoint.end_offset
+            total_rows_processed = checkpoints.aggregate(total=Sum('row_count'))['total']
+            logger.info(
+                f"Resuming {archive} at chunk {start_index+1} "
+                f"(byte {offset}, {total_rows_processed} rows already imported)."
+            )
+        else:
+            checkpoints.delete()
+            start_index, offset, total_rows_processed = 0, 0, 0
+
+        chunk_size = stream_reader.rows_per_batch if stream_reader else self.chunk_size
+        raw_chunks = iter_raw_chunks(csv_file, chunk_size, offset)
+
+        for i in itertools.count(start_index):
+            chunk_started = time.perf_counter()
+            with self.metrics.stage('parse'):
+                raw_chunk = next(raw_chunks, None)
+                if raw_chunk is None:
+                    break
+                data, end_offset = raw_chunk
+                chunk = stream_reader.parse(data) if stream_reader else pd.read_csv(io.BytesIO(data), **self.csv_options())
+
+            with self.metrics.timed_exit(transaction.atomic(), 'commit'):
+                batch = self.load_chunk(chunk, load_rows)
+                ImportCheckpoint.objects.create(
+                    **key,
+                    chunk_index=i,
+                    row_count=len(chunk),
+                    end_offset=end_offset,
+                    content_hash=hashlib.sha256(data).hexdigest()
+                )
+            # Written after the commit, so a retried chunk never appends its rejects twice.
+            self.write_rejects(batch)
+            total_rows_processed+=len(chunk)
+            self.report_progress(archive, i, total_rows_processed, len(chunk), time.perf_counter() - chunk_started)
+
+        return total_rows_processed
+
+    def load_chunk(self, chunk:pd.DataFrame, load_rows) -> TransformedBatch:
+        with self.metrics.stage('transform'):
+            batch = self.transform(chunk)
+        if not batch.valid.empty:
+            with self.metrics.stage('db_write'):
+                load_rows(batch.valid)
+        self.loaded_rows+=len(batch.valid)
+        return batch
+
+    def report_progress(self, archive:str, chunk_index:int, total_rows_processed:int, chunk_rows:int, chunk_seconds:float):
+        self.metrics.batch_done(chunk_rows, chunk_seconds)
+        logger.info(f"Processed chunk {chunk_index+1}... Total rows so far: {total_rows_processed}")
+        if self.progress is not None:
+            self.progress.put((archive, total_rows_processed))
+
+    def write_rejects(self, batch:TransformedBatch):
+        """Appends the rejected rows of a batch to the rejects file, when one was given."""
+        if batch.rejected.empty:
+            return
+
+        self.rejected_rows+=len(batch.rejected)
+        if self.rejects_file:
+            batch.rejected.to_csv(
+                self.rejects_file,
+                mode='a',
+                sep=';',
+                index=False,
+                header=self.rejected_rows == len(batch.rejected)
+            )
+
+
+class CompanyArchiveImporter(ReceitaArchiveImporter):
+    """
+    Imports one Receita Empresas ZIP into Company.
+    With `delta`, only new and changed rows (by content_fingerprint) are written,
+    and `track_seen` collects every imported cnpj to detect companies that disappeared.
+    """
+    command = 'populate_companies'
+    entity = 'company'
+    csv_marker = COMPANIES_CSV_MARKER
+    column_names = COLUMN_NAMES
+
+    def __init__(self, delta:bool=False, track_seen:bool=False, **options):
+        super().__init__(**options)
+        self.delta = delta
+        self.seen = CnpjSet() if track_seen else None
+        self.inserted = 0
+        self.updated = 0
+
+    def column_widths(self) -> dict:
+        return company_column_widths()
+
+    def transform(self, chunk:pd.DataFrame) -> TransformedBatch:
+        batch = transform_chunk(chunk)
+        if self.seen is not None:
+            self.seen.add(batch.valid['cnpj'])
+        return batch
+
+    def copy_loader(self):
+        return CompanyCopyLoader(delta=self.delta)
+
+    def finish_archive(self, archive:str, copy_loader):
+        if copy_loader is not None:
+            self.inserted, self.updated = copy_loader.inserted, copy_loader.updated
+        if self.delta:
+            logger.info(
+                f"Delta for {archive}: {self.inserted} inserted, {self.updated} updated, "
+                f"{self.loaded_rows - self.inserted - self.updated} unchanged."
+            )
+
+    def result(self, archive:str, rows:int, elapsed:float) -> ArchiveResult:
+        return ArchiveResult(
+            archive, rows, self.rejected_rows, elapsed,
+            inserted=self.inserted, updated=self.updated, seen=self.seen, metrics=self.metrics
+        )
+
+    def upsert_with_orm(self, companies:pd.DataFrame):
+        """Performs a bulk upsert of a transformed batch through the ORM."""
+
+        if self.delta:
+            companies = self.changed_companies(companies)
+            if companies.empty:
+                return
+
+        rows = companies.astype(object).where(companies.notna(), None)
+
+        objects_to_upsert = [
+            Company(
+                cnpj=row.cnpj,
+                razao_social=row.razao_social,
+                natureza_juridica=row.natureza_juridica,
+                qualificacao_responsavel=row.qualificacao_responsavel,
+                capital_social=Decimal(row.capital_social).scaleb(-2),
+                porte_empresa=row.porte_empresa,
+                ente_federativo_responsavel=row.ente_federativo_responsavel,
+                content_fingerprint=row.content_fingerprint,
+                razao_social_normalizada=row.razao_social_normalizada
+            )
+            for row in rows.itertuples(index=False)
+        ]
+        Company.objects.bulk_create(
+            objects_to_upsert,
+            update_conflicts=True,
+            unique_fields=['cnpj'],
+            update_fields=['razao_social', 'natureza_juridica', 'qualificacao_responsavel', 'capital_social', 'porte_empresa', 'ente_federativo_responsavel', 'content_fingerprint', 'razao_social_normalizada']
+        )
+
+    def changed_companies(self, companies:pd.DataFrame) -> pd.DataFrame:
+        """
+        Compares the batch fingerprints with the stored ones in a single query
+        and keeps only the new cnpjs and the rows whose content changed.
+        """
+        stored = pd.Series(dict(
+            Company.objects.filter(cnpj__in=companies['cnpj'].tolist()).values_list('cnpj', FINGERPRINT_COLUMN)
+        ), dtype=object)
+        stored_fingerprints = companies['cnpj'].map(stored)
+
+        is_new = ~companies['cnpj'].isin(stored.index)
+        is_changed = ~is_new & (stored_fingerprints != companies[FINGERPRINT_COLUMN])
+        self.inserted+=int(is_new.sum())
+        self.updated+=int(is_changed.sum())
+        return companies[is_new | is_changed]
+
+
+
+class EstablishmentArchiveImporter(ReceitaArchiveImporter):
+    """
+    Imports one Receita Estabelecimentos ZIP into Establishment, linking every row to its
+    IBGE Municipality through a MunicipalityResolver built once from `municipios_zip_path`.
+    """
+    command = 'populate_establishments'
+    entity = 'establishment'
+    csv_marker = ESTABLISHMENTS_CSV_MARKER
+    column_names = ESTABLISHMENT_COLUMN_NAMES
+
+    def __init__(self, municipios_zip_path:Optional[str]=None, resolver:Optional[MunicipalityResolver]=None, **options):
+        super().__init__(**options)
+        self.resolver = resolver or MunicipalityResolver.from_archive(municipios_zip_path)
+        self.fields = {field.column: field.attname for field in Establishment._meta.concrete_fields}
+
+    def column_widths(self) -> dict:
+        return establishment_column_widths()
+
+    def transform(self, chunk:pd.DataFrame) -> TransformedBatch:
+        return transform_establishments(chunk, self.resolver.resolve)
+
+    def copy_loader(self):
+        return EstablishmentCopyLoader()
+
+    def finish_archive(self, archive:str, copy_loader):
+        self.resolver.log_unresolved()
+
+    def upsert_with_orm(self, establishments:pd.DataFrame):
+        """Performs a bulk upsert of a transformed batch through the ORM."""
+        rows = establishments[list(self.fields)].astype(object)
+        rows = rows.where(rows.notna(), None).rename(columns=self.fields)
+
+        objects_to_upsert = [Establishment(**row) for row in rows.to_dict('records')]
+        Establishment.objects.bulk_create(
+            objects_to_upsert,
+            update_conflicts=True,
+            unique_fields=['cnpj'],
+            update_fields=[field.name for field in Establishment._meta.concrete_fields if not field.primary_key]
+        )
+
+
+def import_archive_in_worker(zip_file_path:str, importer_options:dict, progress,
+                             importer_class=CompanyArchiveImporter) -> ArchiveResult:
+    """
+    Entry point for pool workers. Each archive is loaded on the worker's own database
+    connection, in its own transaction unless checkpointing commits per chunk.
+    """
+    importer = importer_class(progress=progress, **importer_options)
+    try:
+        with use_primary(), contextlib.nullcontext() if importer.checkpoint else importer.metrics.timed_exit(transaction.atomic(), 'commit'):
+            return importer.import_archive(zip_file_path)
+    except Exception as e:
+        logger.error(f"Import of {zip_file_path} failed: {e}", exc_info=True)
+        raise ArchiveImportError(f"{zip_file_path}: {e}") from None
+    finally:
+        connections.close_all()
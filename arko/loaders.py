@@ -0,0 +1,157 @@
+import io
+import logging
+import os
+import pandas as pd
+from django.db import connection
+
+from .models import Company, Establishment
+from .transforms import CAPITAL_COLUMN, cents_to_decimal_strings
+
+logger = logging.getLogger(__name__)
+
+COMPANY_COLUMNS = [
+    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel', 'content_fingerprint',
+    'razao_social_normalizada'
+]
+ESTABLISHMENT_COLUMNS = [field.column for field in Establishment._meta.concrete_fields]
+
+
+class CopyLoader:
+    """
+    Loads rows of `model` through an UNLOGGED staging table.
+    Each chunk is streamed with COPY FROM STDIN and merged into the model
+    table with a single INSERT ... ON CONFLICT (primary key) DO UPDATE.
+    Subclasses set the model and the database `columns` the batches carry.
+    """
+    model = None
+    columns = []
+
+    def __init__(self, db_connection=None, staging_table=None):
+        self.connection = db_connection or connection
+        self.table = self.model._meta.db_table
+        self.key = self.model._meta.pk.column
+        self.update_columns = [column for column in self.columns if column != self.key]
+        self.staging_table = staging_table or f"{self.table}_staging_{os.getpid()}"
+
+    def __enter__(self):
+        self.create_staging_table()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Inside a failed transaction the rollback already takes the staging table with it.
+        if exc_type is None or not self.connection.in_atomic_block:
+            self.drop_staging_table()
+
+    def _quote(self, name:str) -> str:
+        return self.connection.ops.quote_name(name)
+
+    def create_staging_table(self):
+        """Creates an empty UNLOGGED copy of the model table without indexes or constraints."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self._quote(self.staging_table)}")
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {self._quote(self.staging_table)} "
+                f"(LIKE {self._quote(self.table)} INCLUDING DEFAULTS)"
+            )
+        logger.info(f"Created staging table {self.staging_table}.")
+
+    def drop_staging_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self._quote(self.staging_table)}")
+
+    def _copy_sql(self) -> str:
+        columns = ', '.join(self._quote(c) for c in self.columns)
+        return f"COPY {self._quote(self.staging_table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    def _merge_sql(self) -> str:
+        columns = ', '.join(self._quote(c) for c in self.columns)
+        updates = ', '.join(f"{self._quote(c)} = EXCLUDED.{self._quote(c)}" for c in self.update_columns)
+        return (
+            f"INSERT INTO {self._quote(self.table)} ({columns}) "
+            f"SELECT {columns} FROM {self._quote(self.staging_table)} "
+            f"ON CONFLICT ({self._quote(self.key)}) DO UPDATE SET {updates}"
+        )
+
+    def prepare(self, frame:pd.DataFrame) -> pd.DataFrame:
+        """Converts a transformed batch into the values COPY expects."""
+        return frame
+
+    def copy_to_staging(self, cursor, frame:pd.DataFrame):
+        buffer = io.StringIO()
+        # Missing values are written as unquoted empty fields, which COPY reads as NULL.
+        self.prepare(frame).to_csv(buffer, columns=self.columns, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(self._copy_sql(), buffer)
+
+    def load(self, frame:pd.DataFrame) -> int:
+        """Copies a transformed batch into the staging table and merges it. Returns the number of rows written."""
+        with self.connection.cursor() as cursor:
+            self.copy_to_staging(cursor, frame)
+            cursor.execute(self._merge_sql())
+            written = cursor.rowcount
+            cursor.execute(f"TRUNCATE {self._quote(self.staging_table)}")
+        return written
+
+
+class CompanyCopyLoader(CopyLoader):
+    """
+    Loads Company rows through the staging table.
+    In delta mode, only new cnpjs are inserted and only rows whose
+    content_fingerprint changed are updated; unchanged rows are not touched.
+    """
+    model = Company
+    columns = COMPANY_COLUMNS
+
+    def __init__(self, db_connection=None, staging_table=None, delta:bool=False):
+        super().__init__(db_connection, staging_table)
+        self.delta = delta
+        self.inserted = 0
+        self.updated = 0
+
+    def _insert_new_sql(self) -> str:
+        columns = ', '.join(self._quote(c) for c in self.columns)
+        source = ', '.join(f"s.{self._quote(c)}" for c in self.columns)
+        return (
+            f"INSERT INTO {self._quote(self.table)} ({columns}) "
+            f"SELECT {source} FROM {self._quote(self.staging_table)} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {self._quote(self.table)} c WHERE c.{self._quote(self.key)} = s.{self._quote(self.key)})"
+        )
+
+    def _update_changed_sql(self) -> str:
+        updates = ', '.join(f"{self._quote(c)} = s.{self._quote(c)}" for c in self.update_columns)
+        fingerprint = self._quote('content_fingerprint')
+        return (
+            f"UPDATE {self._quote(self.table)} c SET {updates} "
+            f"FROM {self._quote(self.staging_table)} s "
+            f"WHERE c.{self._quote(self.key)} = s.{self._quote(self.key)} "
+            f"AND c.{fingerprint} IS DISTINCT FROM s.{fingerprint}"
+        )
+
+    def prepare(self, companies:pd.DataFrame) -> pd.DataFrame:
+        return companies.assign(**{CAPITAL_COLUMN: cents_to_decimal_strings(companies[CAPITAL_COLUMN])})
+
+    def load(self, companies:pd.DataFrame) -> int:
+        """
+        Copies a transformed batch (capital_social in cents) into the staging table and merges it.
+        Returns the number of rows written.
+        """
+        if not self.delta:
+            return super().load(companies)
+
+        with self.connection.cursor() as cursor:
+            self.copy_to_staging(cursor, companies)
+            cursor.execute(self._update_changed_sql())
+            updated = cursor.rowcount
+            cursor.execute(self._insert_new_sql())
+            inserted = cursor.rowcount
+            self.updated+=updated
+            self.inserted+=inserted
+            cursor.execute(f"TRUNCATE {self._quote(self.staging_table)}")
+        return inserted + updated
+
+
+class EstablishmentCopyLoader(CopyLoader):
+    """Loads Establishment rows through the staging table."""
+    model = Establishment
+    columns = ESTABLISHMENT_COLUMNS
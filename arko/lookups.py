@@ -0,0 +1,136 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .models import IBGE_DATA, DataVersion, District, Municipality, Region, State
+from .transforms import normalize_name
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_LIMIT = 20
+# How long the IBGE data version read by reference() is trusted before it is queried again.
+VERSION_TTL = 5 ## seconds
+
+
+class NameEntry(NamedTuple):
+    id: int
+    # The name as stored in `nome_normalizado`.
+    name: str
+    # Text shown to the user, e.g. 'São José - SC'.
+    label: str
+    estado_id: Optional[int]
+
+
+class NameIndex:
+    """
+    In-memory prefix index over the names of a reference table. Every name is stored once per
+    word, as the suffix starting at that word ('SAO JOSE DOS CAMPOS', 'JOSE DOS CAMPOS', ...),
+    in a sorted list, so the names containing a word that starts with the term are one bisect away.
+    """
+
+    def __init__(self, entries:Iterable[NameEntry]):
+        self.entries = {entry.id: entry for entry in entries}
+        keys = sorted(
+            (' '.join(words[position:]), entry.id)
+            for entry in self.entries.values()
+            for words in [entry.name.split()]
+            for position in range(len(words))
+        )
+        self.keys = [key for key, _ in keys]
+        self.ids = [entry_id for _, entry_id in keys]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def label(self, entry_id) -> Optional[str]:
+        try:
+            entry = self.entries.get(int(entry_id))
+        except (TypeError, ValueError):
+            return None
+        return entry.label if entry else None
+
+    def search(self, text:str, estado_id:Optional[int]=None, limit:int=AUTOCOMPLETE_LIMIT) -> List[NameEntry]:
+        """
+        Entries with a word starting with the normalized `text`, optionally of one state:
+        names starting with it first, then the others, each alphabetically.
+        """
+        prefix = normalize_name(text)
+        if not prefix:
+            return []
+        matches = {}
+        position = bisect.bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            entry = self.entries[self.ids[position]]
+            if estado_id is None or entry.estado_id == estado_id:
+                starts_with = entry.name.startswith(prefix)
+                matches[entry.id] = starts_with or matches.get(entry.id, False)
+            position+=1
+        ranked = sorted(matches, key=lambda entry_id: (not matches[entry_id], self.entries[entry_id].name))
+        return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+
+def municipality_index() -> NameIndex:
+    rows = Municipality.objects.values_list('id', 'nome_normalizado', 'nome', 'estado__sigla', 'estado_id')
+    return NameIndex(NameEntry(id, name or '', f'{nome} - {sigla}', estado_id) for id, name, nome, sigla, estado_id in rows.iterator())
+
+
+def district_index() -> NameIndex:
+    rows = District.objects.values_list('id', 'nome_normalizado', 'nome', 'municipio__nome', 'estado__sigla', 'estado_id')
+    return NameIndex(
+        NameEntry(id, name or '', f'{nome} ({municipio} - {sigla})', estado_id)
+        for id, name, nome, municipio, sigla, estado_id in rows.iterator()
+    )
+
+
+def state_choices() -> List[Tuple[int, str]]:
+    return list(State.objects.order_by('nome').values_list('id', 'nome'))
+
+
+def region_choices() -> List[Tuple[int, str]]:
+    return list(Region.objects.order_by('nome').values_list('id', 'nome'))
+
+
+BUILDERS:Dict[str, Callable] = {
+    'municipalities': municipality_index,
+    'districts': district_index,
+    'states': state_choices,
+    'regions': region_choices,
+}
+
+_built = {}
+_lock = threading.Lock()
+# (version, time.monotonic() when it was read)
+_version = (None, 0.0)
+
+
+def current_version() -> int:
+    """
+    The IBGE data version, queried at most once every VERSION_TTL seconds per process, so a
+    page rendering several lookups does not query DataVersion for each of them.
+    """
+    global _version
+    version, read_at = _version
+    now = time.monotonic()
+    if version is None or now - read_at >= VERSION_TTL:
+        version = DataVersion.current(IBGE_DATA).version
+        _version = (version, now)
+    return version
+
+
+def reference(name:str):
+    """
+    The IBGE reference data built by BUILDERS[name], kept for the life of the process and
+    rebuilt on the first use after populate_ibge bumps the data version (within VERSION_TTL).
+    """
+    version = current_version()
+    built = _built.get(name)
+    if built is None or built[0] != version:
+        with _lock:
+            built = _built.get(name)
+            if built is None or built[0] != version:
+                built = (version, BUILDERS[name]())
+                _built[name] = built
+                logger.info(f"Built the '{name}' lookup for IBGE data version {version}: {len(built[1])} entries.")
+    return built[1]
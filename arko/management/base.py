@@ -0,0 +1,290 @@
+import contextlib
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from queue import Empty
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from arko.bulk import BULK_REWRITE_RATIO, DEFAULT_MAINTENANCE_WORK_MEM, MAINTENANCE_WORK_MEM_PATTERN, SecondaryIndexes, estimate_archive_rows
+from arko.importers import LOADER_ORM, LOADERS, READER_PANDAS, READERS, find_archives, import_archive_in_worker, rejects_file_for
+from arko.metrics import ImportMetrics
+from arko.models import DataVersion
+from arko.readers import DEFAULT_MEMORY_BUDGET
+from arko.routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 5 ## seconds
+
+class PrimaryDatabaseCommand(BaseCommand):
+    """Command whose queries all go to the primary database, reads included, even when a replica is configured."""
+
+    def execute(self, *args, **options):
+        with use_primary():
+            return super().execute(*args, **options)
+
+
+class ReceitaImportCommand(PrimaryDatabaseCommand):
+    """
+    Shared options and orchestration of the commands that import Receita Federal ZIPs:
+    archive discovery, serial or process-pool imports, checkpoints, rejects and metrics.
+    Subclasses set `importer_class`, `model` and `entity_plural`, and may add options through `get_importer_options`.
+    """
+    importer_class = None
+    model = None
+    entity_plural = None
+    archive_help = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'zip_file_path',
+            type=str,
+            help=self.archive_help
+        )
+        parser.add_argument(
+            '--loader',
+            choices=LOADERS,
+            default=LOADER_ORM,
+            help="'orm' upserts with bulk_create; 'copy' streams chunks into an UNLOGGED staging table and merges them."
+        )
+        parser.add_argument(
+            '--reader',
+            choices=READERS,
+            default=READER_PANDAS,
+            help="'pandas' reads 50k-row chunks with pd.read_csv; 'stream' parses into reusable column buffers "
+                 "in batches sized by --memory-budget, keeping memory flat on small containers."
+        )
+        parser.add_argument(
+            '--memory-budget',
+            type=int,
+            default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+            help="Memory budget in MB that sizes the batches of the 'stream' reader."
+        )
+        parser.add_argument(
+            '--rejects-file',
+            type=str,
+            default=None,
+            help="Optional CSV file that receives the rows rejected by validation, with the rejection reason."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="Number of worker processes. With more than one, each archive is imported in its own process and transaction."
+        )
+        parser.add_argument(
+            '--checkpoint',
+            action='store_true',
+            help="Commit every chunk on its own and record its progress in the ImportCheckpoint table."
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help="Continue after the last checkpointed chunk of each archive. Implies --checkpoint."
+        )
+        parser.add_argument(
+            '--snapshot-dir',
+            type=str,
+            default=None,
+            help="Directory of columnar snapshots. Each parsed archive is saved there, and later runs "
+                 "over the same archive read the memory-mapped snapshot instead of the ZIP. Not used with --checkpoint."
+        )
+        parser.add_argument(
+            '--bulk-mode',
+            action='store_true',
+            help="On an initial load, or one that rewrites most of the table, drop the secondary indexes, "
+                 "load, then rebuild them concurrently and run ANALYZE."
+        )
+        parser.add_argument(
+            '--maintenance-work-mem',
+            type=str,
+            default=DEFAULT_MAINTENANCE_WORK_MEM,
+            help="maintenance_work_mem used to rebuild the indexes in --bulk-mode, e.g. '512MB' or '2GB'."
+        )
+        parser.add_argument(
+            '--metrics-out',
+            type=str,
+            default=None,
+            help="Write a JSON summary of stage timings, rows/sec, chunk latency percentiles and peak memory to this file."
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help="Also track the peak Python heap with tracemalloc (slows the import down)."
+        )
+
+    def get_importer_options(self, options) -> dict:
+        return {
+            'loader': options['loader'],
+            'reader': options['reader'],
+            'memory_budget': options['memory_budget'] * 1024 * 1024,
+            'checkpoint': options['checkpoint'],
+            'resume': options['resume'],
+            'trace_memory': options['trace_memory'],
+            'snapshot_dir': options['snapshot_dir'],
+        }
+
+    def handle(self, *args, **options):
+        archives = find_archives(options['zip_file_path'])
+        if not archives:
+            raise CommandError(f"No ZIP archives found at {options['zip_file_path']}.")
+
+        if options['snapshot_dir'] and (options['checkpoint'] or options['resume']):
+            raise CommandError("--snapshot-dir cannot be combined with --checkpoint or --resume.")
+        # Checked here rather than by the rebuild, once the indexes are already gone.
+        if not re.fullmatch(MAINTENANCE_WORK_MEM_PATTERN, options['maintenance_work_mem'].strip()):
+            raise CommandError(f"Invalid --maintenance-work-mem: {options['maintenance_work_mem']}. Use e.g. '512MB' or '2GB'.")
+        if options['snapshot_dir']:
+            os.makedirs(options['snapshot_dir'], exist_ok=True)
+
+        workers = max(1, min(options['workers'], len(archives)))
+        importer_options = self.get_importer_options(options)
+        self.metrics = ImportMetrics(self.importer_class.command, trace_memory=options['trace_memory'])
+        logger.info(f"Importing {len(archives)} archive(s) with {workers} worker(s)...")
+
+        # Before anything else, so an earlier bulk load that was killed does not leave the table without its indexes.
+        SecondaryIndexes(self.model._meta.db_table).restore(options['maintenance_work_mem'])
+
+        indexes = None
+        if options['bulk_mode'] and self.should_defer_indexes(archives, options):
+            indexes = SecondaryIndexes(self.model._meta.db_table)
+            indexes.drop()
+
+        try:
+            if workers == 1:
+                results = self.import_serially(archives, importer_options, options['rejects_file'])
+            else:
+                results = self.import_in_parallel(archives, workers, importer_options, options['rejects_file'])
+        except Exception as e:
+            logger.error(f"A critial error occured: {e}", exc_info=True)
+            if indexes is not None:
+                # The import rolled back, but the indexes were dropped outside its transaction. A rebuild
+                # error must not hide the import's own; the next run restores what is still missing.
+                try:
+                    indexes.rebuild(options['maintenance_work_mem'])
+                except Exception as rebuild_error:
+                    logger.error(f"Could not rebuild the indexes of {indexes.table} after the failure: {rebuild_error}", exc_info=True)
+            raise
+
+        if indexes is not None:
+            with self.metrics.stage('index_rebuild'):
+                indexes.rebuild(options['maintenance_work_mem'])
+
+        total_rows = sum(result.rows for result in results)
+        total_rejected = sum(result.rejected for result in results)
+        if total_rejected:
+            logger.warning(f"{total_rejected} rows were rejected by validation.")
+        logger.info(f"Processed {total_rows} rows from {len(results)} archive(s).")
+        if total_rows:
+            # Before the bump, so pages cached under the new version are computed from the new summaries.
+            with self.metrics.stage('summary_refresh'):
+                self.refresh_summaries()
+            DataVersion.bump(self.entity_plural)
+        self.report(results, options)
+
+        if options['metrics_out']:
+            self.metrics.write(options['metrics_out'])
+        else:
+            self.metrics.log_summary()
+        logger.info(f"Successfully imported data for {self.model.objects.count()} {self.entity_plural}.")
+
+    def should_defer_indexes(self, archives, options) -> bool:
+        """
+        Bulk mode only pays off when the load writes most of the table: an initial load, or
+        incoming rows amounting to at least BULK_REWRITE_RATIO of the stored ones. A delta
+        refresh only rewrites the changed rows, so it qualifies only on an empty table.
+        """
+        stored = SecondaryIndexes(self.model._meta.db_table).estimated_rows()
+        incoming = estimate_archive_rows(archives, self.importer_class.csv_marker)
+        if stored == 0:
+            logger.info(f"Bulk mode: initial load of about {incoming} rows.")
+            return True
+        if not options.get('delta') and incoming >= BULK_REWRITE_RATIO * stored:
+            logger.info(f"Bulk mode: about {incoming} incoming rows rewrite most of the {stored} stored rows.")
+            return True
+        logger.info(f"Bulk mode skipped: about {incoming} incoming rows against {stored} stored rows; keeping the indexes.")
+        return False
+
+    def refresh_summaries(self):
+        """Hook to recompute the data derived from the imported rows, run when the import processed any."""
+
+    def report(self, results, options):
+        """Hook for command-specific reporting once every archive was imported."""
+
+    def import_serially(self, archives, importer_options, rejects_file):
+        """
+        Imports every archive in this process, inside a single transaction
+        unless checkpointing commits per chunk.
+        """
+        checkpoint = importer_options['checkpoint'] or importer_options['resume']
+        results = []
+        with contextlib.nullcontext() if checkpoint else self.metrics.timed_exit(transaction.atomic(), 'commit'):
+            for archive in archives:
+                archive_rejects_file = rejects_file if len(archives) == 1 else rejects_file_for(rejects_file, archive)
+                importer = self.importer_class(rejects_file=archive_rejects_file, metrics=self.metrics, **importer_options)
+                results.append(importer.import_archive(archive))
+        return results
+
+    def import_in_parallel(self, archives, workers, importer_options, rejects_file):
+        """
+        Fans the archives out to a process pool. Each worker commits its own archive;
+        the parent aggregates chunk progress and collects the failures.
+        """
+        # Forked workers must not share the parent's database connection.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+
+        results = []
+        errors = []
+        rows_by_archive = {archive: 0 for archive in archives}
+
+        with context.Manager() as manager:
+            progress = manager.Queue()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                pending = {
+                    pool.submit(
+                        import_archive_in_worker,
+                        archive,
+                        {**importer_options, 'rejects_file': rejects_file_for(rejects_file, archive)},
+                        progress,
+                        self.importer_class
+                    )
+                    for archive in archives
+                }
+
+                while pending:
+                    done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    self.drain_progress(progress, rows_by_archive)
+
+                    for future in done:
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            errors.append(str(e))
+                            continue
+                        results.append(result)
+                        self.metrics.merge(result.metrics)
+                        logger.info(
+                            f"Finished {result.archive}: {result.rows} rows in {result.elapsed:.1f}s "
+                            f"({result.rows / max(result.elapsed, 1e-9):.0f} rows/s)."
+                        )
+
+                    logger.info(
+                        f"Progress: {sum(rows_by_archive.values())} rows, "
+                        f"{len(results)}/{len(archives)} archives done, {len(errors)} failed."
+                    )
+
+        if errors:
+            raise CommandError(f"{len(errors)} archive(s) failed to import: " + '; '.join(errors))
+        return results
+
+    def drain_progress(self, progress, rows_by_archive):
+        """Reads every pending (archive, rows) update sent by the workers."""
+        while True:
+            try:
+                archive, rows = progress.get_nowait()
+            except Empty:
+                return
+            rows_by_archive[archive] = rows
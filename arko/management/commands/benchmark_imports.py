@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import django
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from arko.benchmarks import DEFAULT_SEED, IBGEFixtures, IBGEStubServer, generate_company_archives
+from arko.importers import LOADER_COPY, LOADERS
+from arko.management.base import PrimaryDatabaseCommand
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_IBGE = 'ibge'
+SCENARIO_COMPANIES = 'companies'
+SCENARIOS = [SCENARIO_IBGE, SCENARIO_COMPANIES]
+# Metrics compared with the baseline: (key, whether higher is better).
+COMPARED_METRICS = [('rows_per_second', True), ('wall_seconds', False), ('peak_rss_bytes', False)]
+DEFAULT_TOLERANCE = 0.15
+
+
+class Command(PrimaryDatabaseCommand):
+    help = (
+        "Benchmarks populate_ibge and populate_companies end to end on synthetic data, in a "
+        "throwaway database, and compares the results with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios',
+            nargs='+',
+            choices=SCENARIOS,
+            default=SCENARIOS,
+            help="Imports to benchmark: 'ibge' runs populate_ibge against a local stub of the API, twice "
+                 "(initial load, then unchanged data); 'companies' runs populate_companies on generated EMPRECSV "
+                 "archives, twice per loader (initial load, then a reload of the same rows)."
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000000,
+            help="Number of generated companies, e.g. 1000000 or 10000000."
+        )
+        parser.add_argument(
+            '--archives',
+            type=int,
+            default=1,
+            help="Number of ZIPs the companies are split into."
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=DEFAULT_SEED,
+            help="Seed of the generated data. The same seed, rows and archives always produce the same files."
+        )
+        parser.add_argument(
+            '--data-dir',
+            type=str,
+            default=os.path.join(tempfile.gettempdir(), 'arko-benchmarks'),
+            help="Directory of the generated archives, which are reused by later runs with the same parameters."
+        )
+        parser.add_argument(
+            '--loaders',
+            nargs='+',
+            choices=LOADERS,
+            default=[LOADER_COPY],
+            help="populate_companies loaders to benchmark."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="--workers passed to populate_companies."
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help="Write the results as JSON to this file."
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=None,
+            help="Results file of an earlier run. The command fails when a scenario is slower, or uses "
+                 "more memory, than in the baseline by more than --tolerance."
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=DEFAULT_TOLERANCE,
+            help="Relative change against the baseline tolerated before it counts as a regression."
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help="Keep the benchmark database after the run and reuse it on the next one instead of creating it again."
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        archives = []
+        if SCENARIO_COMPANIES in options['scenarios']:
+            directory = os.path.join(options['data_dir'], f"empresas-{options['rows']}-{options['archives']}-{options['seed']}")
+            logger.info(f"Generating {options['rows']} companies in {directory}...")
+            archives = generate_company_archives(directory, options['rows'], options['archives'], options['seed'])
+
+        # The imports run in a database of their own, created like the test database, so the real data is never touched.
+        database_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = f'benchmark_{database_name}'
+        benchmark_database = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb']
+        )
+        try:
+            results = self.run_scenarios(options, archives, benchmark_database)
+        finally:
+            connection.creation.destroy_test_db(database_name, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'parameters': {key: options[key] for key in ('rows', 'archives', 'seed', 'loaders', 'workers')},
+            'environment': self.environment(),
+            'scenarios': results,
+        }
+        regressions = []
+        if baseline is not None:
+            if baseline.get('parameters') != report['parameters']:
+                logger.warning(f"The baseline was run with {baseline.get('parameters')}, not {report['parameters']}; the comparison may not be meaningful.")
+            report['baseline'] = self.compare(results, baseline.get('scenarios', {}), options['tolerance'])
+            regressions = [
+                f"{scenario} {metric}: {change['baseline']} -> {change['current']} ({change['change']:+.1%})"
+                for scenario, metrics in report['baseline'].items()
+                for metric, change in metrics.items() if change['regression']
+            ]
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            logger.info(f"Benchmark results written to {options['output']}.")
+        self.print_results(results, report.get('baseline'))
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}: " + '; '.join(regressions))
+
+    def run_scenarios(self, options, archives:List[str], database:str) -> Dict[str, dict]:
+        # Every scenario starts from empty tables, also in a database kept by --keepdb.
+        call_command('flush', interactive=False, verbosity=0)
+        results = {}
+        if SCENARIO_IBGE in options['scenarios']:
+            fixtures = IBGEFixtures(options['seed'])
+            logger.info(f"Serving {fixtures.counts} from a local IBGE stub.")
+            with IBGEStubServer(fixtures) as stub:
+                for name in ('ibge_initial', 'ibge_unchanged'):
+                    results[name] = self.run_import(name, database, ['populate_ibge', '--api-url', stub.url])
+
+        if SCENARIO_COMPANIES in options['scenarios']:
+            for loader in options['loaders']:
+                self.truncate_companies()
+                arguments = ['populate_companies', os.path.join(os.path.dirname(archives[0]), 'Empresas*.zip'),
+                             '--loader', loader, '--workers', str(options['workers'])]
+                results[f'companies_{loader}_initial'] = self.run_import(f'companies_{loader}_initial', database, arguments)
+                results[f'companies_{loader}_reload'] = self.run_import(f'companies_{loader}_reload', database, arguments)
+        return results
+
+    def truncate_companies(self):
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE arko_company CASCADE')
+
+    def run_import(self, name:str, database:str, arguments:List[str]) -> dict:
+        """
+        Runs the import command in a fresh Python process, so the peak RSS it reports is its own,
+        and reads back the summary it writes with --metrics-out.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            metrics_file = os.path.join(directory, 'metrics.json')
+            command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *arguments, '--metrics-out', metrics_file]
+            environment = {**os.environ, 'DB_NAME': database}
+            # The benchmark database only exists on the primary.
+            environment.pop('DB_REPLICA_HOST', None)
+
+            logger.info(f"Running {name}: {' '.join(arguments)}")
+            started = time.perf_counter()
+            completed = subprocess.run(command, env=environment)
+            wall_seconds = time.perf_counter() - started
+            # populate_ibge logs failures and exits cleanly; the missing metrics file is what tells.
+            if completed.returncode != 0 or not os.path.exists(metrics_file):
+                raise CommandError(f"Scenario {name} failed (exit code {completed.returncode}).")
+            with open(metrics_file) as metrics:
+                summary = json.load(metrics)
+
+        return {
+            'command': arguments,
+            'rows': summary['rows'],
+            'wall_seconds': round(wall_seconds, 3),
+            'elapsed_seconds': summary['elapsed_seconds'],
+            'rows_per_second': summary['rows_per_second'],
+            'peak_rss_bytes': summary['memory']['peak_rss_bytes'],
+            'stages': {stage: values['seconds'] for stage, values in summary['stages'].items()},
+        }
+
+    def environment(self) -> dict:
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW server_version')
+            server_version = cursor.fetchone()[0]
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'postgresql': server_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        }
+
+    @staticmethod
+    def compare(results:Dict[str, dict], baseline:Dict[str, dict], tolerance:float) -> Dict[str, dict]:
+        """Relative change of every COMPARED_METRICS value of the scenarios present in both runs."""
+        comparison = {}
+        for scenario, result in results.items():
+            if scenario not in baseline:
+                continue
+            comparison[scenario] = {}
+            for metric, higher_is_better in COMPARED_METRICS:
+                before, after = baseline[scenario].get(metric), result[metric]
+                if not before:
+                    continue
+                change = (after - before) / before
+                comparison[scenario][metric] = {
+                    'baseline': before,
+                    'current': after,
+                    'change': round(change, 4),
+                    'regression': (-change if higher_is_better else change) > tolerance,
+                }
+        return comparison
+
+    def print_results(self, results:Dict[str, dict], comparison:Optional[Dict[str, dict]]):
+        self.stdout.write(f"{'scenario':<28}{'rows':>10}{'rows/s':>12}{'wall s':>10}{'peak RSS MB':>13}  baseline")
+        for scenario, result in results.items():
+            changes = ', '.join(
+                f"{metric} {change['change']:+.1%}{' REGRESSION' if change['regression'] else ''}"
+                for metric, change in (comparison or {}).get(scenario, {}).items()
+            )
+            self.stdout.write(
+                f"{scenario:<28}{result['rows']:>10}{result['rows_per_second']:>12.1f}{result['wall_seconds']:>10.1f}"
+                f"{result['peak_rss_bytes'] / 1024 / 1024:>13.1f}  {changes or '-'}"
+            )
@@ -1,81 +1,62 @@
 import logging
-import pandas as pd
-import zipfile
-from decimal import Decimal, InvalidOperation
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from arko.models import Company
+from arko.delta import CnpjSet, iter_missing_cnpjs
+from arko.importers import CompanyArchiveImporter
+from arko.management.base import ReceitaImportCommand
+from arko.models import Company, CompanySummary
 
 logger = logging.getLogger(__name__)
 
-COLUMN_NAMES = [
-    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
-    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
-]
-
-class Command(BaseCommand):
+class Command(ReceitaImportCommand):
     help = 'Populates the Company model from the official Receita Federal ZIP.'
+    importer_class = CompanyArchiveImporter
+    model = Company
+    entity_plural = 'companies'
+    archive_help = "The full path to an EmpresaX.zip file, a directory of Empresas ZIPs or a glob like 'data/Empresas*.zip'."
 
     def add_arguments(self, parser):
-        parser.add_argument('zip_file_path', type=str, help="The full path to the EmpresaX.zip file.")
-    
-    @transaction.atomic
-    def handle(self, *args, **options):
-        zip_file_path = options['zip_file_path']
-        chunk_size = 50000
-
-        logger.info(f"Starting company data import from {zip_file_path}...")
-
-        try:
-            with zipfile.ZipFile(zip_file_path, 'r') as zf:
-                csv_filename = next((name for name in zf.namelist() if 'EMPRECSV' in name.upper()), None)
-                if not csv_filename:
-                    raise FileNotFoundError("No 'EMPRESAS' CSV file found in the ZIP archive.")
-                
-                logger.info(f"Found CSV file in ZIP: {csv_filename}")
-                with zf.open(csv_filename, 'r') as csv_file:
-                    csv_reader = pd.read_csv(
-                        csv_file,
-                        header=None,
-                        names=COLUMN_NAMES,
-                        sep=';',
-                        encoding='latin-1',
-                        dtype=str,
-                        chunksize=chunk_size
-                    )
-
-                    total_rows_processed = 0
-
-                    for i, chunk in enumerate(csv_reader):
-                        self.process_chunk(chunk)
-                        total_rows_processed+=len(chunk)
-                        logger.info(f"Processed chunk {i+1}... Total rows so far: {total_rows_processed}")
-        except Exception as e:
-            logger.error(f"A critial error occured: {e}", exc_info=True)
-            raise
-    
-    logger.info(f"Successfully imported data for {Company.objects.count()} companies.")
-
-    def process_chunk(self, chunk:pd.DataFrame):
-        """Processes a single chunk of the DataFrame and performs a bulk upsert."""
-
-        chunk['capital_social'] = chunk['capital_social'].str.replace(',', '.', regex=False)
-        chunk['capital_social'] = pd.to_numeric(chunk['capital_social'], errors='coerce').fillna(0).astype(float)
-
-        objects_to_upsert = []
-        for _, row in chunk.iterrows():
-            objects_to_upsert.append(Company(
-                    cnpj=row['cnpj'],
-                    razao_social=row['razao_social'],
-                    natureza_juridica=row['natureza_juridica'],
-                    qualificacao_responsavel=row['qualificacao_responsavel'],
-                    capital_social=Decimal(row['capital_social']),
-                    porte_empresa=row['porte_empresa'],
-                    ente_federativo_responsavel=row['ente_federativo_responsavel']
-                ))
-        Company.objects.bulk_create(
-            objects_to_upsert,
-            update_conflicts=True,
-            unique_fields=['cnpj'],
-            update_fields=['razao_social', 'natureza_juridica', 'qualificacao_responsavel', 'capital_social', 'porte_empresa', 'ente_federativo_responsavel']
-        )
\ No newline at end of file
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            help="Only insert new cnpjs and update rows whose content fingerprint changed."
+        )
+        parser.add_argument(
+            '--report-missing',
+            type=str,
+            default=None,
+            help="Write to this file the cnpjs stored in the database that none of the archives contained. "
+                 "Only meaningful when the run covers the complete dataset."
+        )
+
+    def get_importer_options(self, options):
+        return {
+            **super().get_importer_options(options),
+            'delta': options['delta'],
+            'track_seen': bool(options['report_missing']),
+        }
+
+    def refresh_summaries(self):
+        logger.info("Refreshing the company summaries...")
+        CompanySummary.refresh(concurrently=True)
+
+    def report(self, results, options):
+        if options['delta']:
+            logger.info(
+                f"Delta refresh: {sum(result.inserted for result in results)} inserted, "
+                f"{sum(result.updated for result in results)} updated."
+            )
+        if options['report_missing']:
+            self.report_missing(results, options['report_missing'])
+
+    def report_missing(self, results, output_path):
+        """Merges the cnpjs seen by every archive and writes the stored cnpjs that were not among them."""
+        seen = CnpjSet()
+        for result in results:
+            seen.update(result.seen)
+
+        missing = 0
+        with open(output_path, 'w') as output:
+            for cnpjs in iter_missing_cnpjs(seen):
+                output.writelines(f"{cnpj}\n" for cnpj in cnpjs)
+                missing+=len(cnpjs)
+        logger.info(f"{missing} companies in the database were not present in the import. List written to {output_path}.")
@@ -0,0 +1,29 @@
+import logging
+from arko.importers import EstablishmentArchiveImporter
+from arko.management.base import ReceitaImportCommand
+from arko.models import Establishment
+from arko.resolvers import MunicipalityResolver
+
+logger = logging.getLogger(__name__)
+
+class Command(ReceitaImportCommand):
+    help = 'Populates the Establishment model from the official Receita Federal Estabelecimentos ZIPs, linked to the IBGE municipalities.'
+    importer_class = EstablishmentArchiveImporter
+    model = Establishment
+    entity_plural = 'establishments'
+    archive_help = "The full path to an EstabelecimentosX.zip file, a directory of Estabelecimentos ZIPs or a glob like 'data/Estabelecimentos*.zip'."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--municipios',
+            type=str,
+            required=True,
+            help="Path to the Receita Municipios.zip, which maps the Receita municipality codes to names. "
+                 "Run populate_ibge first: the codes are matched to the IBGE municipalities by UF and name."
+        )
+
+    def get_importer_options(self, options):
+        # Built once here and shared by every archive (and copied into forked workers).
+        resolver = MunicipalityResolver.from_archive(options['municipios'])
+        return {**super().get_importer_options(options), 'resolver': resolver}
@@ -1,141 +1,112 @@
 import logging
-from django.core.management import BaseCommand
+import time
+from django.conf import settings
+from django.core.management import CommandError
 from django.db import transaction
-from arko.models import District,Municipality, Region, State
-from arko.services import IBGEApiClient
+from arko.management.base import PrimaryDatabaseCommand
+from arko.metrics import ImportMetrics
+from arko.models import IBGE_DATA, DataVersion
+from arko.services import DEFAULT_CACHE_TTL, IBGEApiClient, ResponseCache
+from arko.sync import IBGEHierarchySync
 
 logger = logging.getLogger(__name__)
 
-class Command(BaseCommand):
+class Command(PrimaryDatabaseCommand):
     help = 'Populates the database with States, Municipalities, and Dristricts from IBGE API.'
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.client =IBGEApiClient()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--metrics-out',
+            type=str,
+            default=None,
+            help="Write a JSON summary of stage timings (HTTP fetch, JSON decode, validation, diff, database writes) to this file."
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help="Fetch municipalities and districts per UF with up to this many concurrent requests."
+        )
+        parser.add_argument(
+            '--api-url',
+            type=str,
+            default=None,
+            help="Base URL of the IBGE localities API (defaults to the IBGE_API_URL setting), e.g. a local mirror."
+        )
+        parser.add_argument(
+            '--cache-dir',
+            type=str,
+            default=settings.IBGE_CACHE_DIR,
+            help="Directory of the compressed on-disk cache of API responses (defaults to the IBGE_CACHE_DIR setting)."
+        )
+        parser.add_argument(
+            '--cache-ttl',
+            type=int,
+            default=DEFAULT_CACHE_TTL,
+            help="Seconds a cached response is used without asking the API; older ones are revalidated with ETag/Last-Modified."
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help="Only replay the responses in --cache-dir, without any network access."
+        )
+        parser.add_argument(
+            '--full-validation',
+            action='store_true',
+            help="Validate municipalities and districts against the full nested schemas instead of the lean projections."
+        )
+        parser.add_argument(
+            '--keep-missing',
+            action='store_true',
+            help="Do not delete the regions, states, municipalities and districts that are missing from the IBGE payload."
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help="Also track the peak Python heap with tracemalloc."
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         """"
         Main execution method for the command.
         """
+        self.metrics = ImportMetrics('populate_ibge', log_interval=0, trace_memory=options['trace_memory'])
+        if options['offline'] and not options['cache_dir']:
+            raise CommandError("--offline needs --cache-dir (or the IBGE_CACHE_DIR setting).")
+        cache = ResponseCache(options['cache_dir'], ttl=options['cache_ttl']) if options['cache_dir'] else None
+        self.client = IBGEApiClient(
+            self.metrics,
+            base_url=options['api_url'],
+            concurrency=options['concurrency'],
+            cache=cache,
+            offline=options['offline'],
+            full_validation=options['full_validation']
+        )
+
         logger.info('Starting import of IBGE data...') 
         try:
-            self._import_regions_and_state()
-            self._bulk_import_municipalities()
-            self._bulk_import_districts()
+            states = self._timed_level(self.client.get_states)
+            municipalities = self._timed_level(lambda: self.client.get_all_municipalities(states))
+            districts = self._timed_level(lambda: self.client.get_all_districts(states))
+
+            with self.metrics.timed_exit(transaction.atomic(), 'commit'):
+                results = IBGEHierarchySync(self.metrics, delete=not options['keep_missing']).sync(states, municipalities, districts)
+                if any(result.created or result.updated or result.deleted for result in results):
+                    logger.info(f"IBGE data changed, now at {DataVersion.bump(IBGE_DATA)}.")
         except Exception as e:
             logger.error(f"A critical error occured during the import process: {e}", exc_info=True)
             logger.warning('Operation cancelled. No changes were saved to the database.')
             return
 
         logger.info('Import completed successfully!')
-
-    def _import_regions_and_state(self):
-        """
-        Imports Regions and States. 
-        """
-        logger.info('Importing Regions and States...')
-        states_data = self.client.get_states()
-
-        regions_created = 0
-        states_created = 0
-
-        for data in states_data:
-            region_data = data.regiao
-
-            try:
-                _, created = Region.objects.get_or_create(
-                id = region_data.id,
-                defaults={'sigla': region_data.sigla, 'nome': region_data.nome}
-                )
-                regions_created+=1
-            except Exception as e:
-                logging.ERROR(f"Error in create region: {e}")
-
-            try:
-                region_obj = Region.objects.get(id=region_data.id)
-
-                _, created = State.objects.get_or_create(
-                    id=data.id,
-                    defaults={'sigla': data.id, 'nome': data.nome, 'regiao': region_obj}
-                )   
-
-                states_created+=1
-            except Exception as e:
-                logging.ERROR(f"Errir ub create State {e}")
-
-            
-        logger.info(f"{regions_created} new regions and {states_created} new states processed.")
-
-    def _bulk_import_municipalities(self):
-        """
-        Bulk imports all municipalities, designed for high performance.
-        1. Fetches all municipality data in a single API call.
-        2. Fetches existing data from the DB into memory to avoid loops of queries.
-        3. Inserts all new municipalities in a single bulk_create query.
-        """
-        logger.info('Bulk importing Municipalities...')
-        
-        municipalities_data = self.client.get_all_municipalities()
-
-        states_map = {s.id: s for s in State.objects.all()}
-        existing_ids = set(Municipality.objects.values_list('id', flat=True))
-
-        municipalities_to_create = []
-        for data in municipalities_data:
-            if data.id in existing_ids:
-                continue
-
-            if not data.microrregiao:
-                logger.warning(f"Municipality {data.id} ({data.nome}) is missing microrregiao data from API. Skipping.")
-                continue
-
-            state_id = data.microrregiao.mesorregiao.UF.id
-            state_instance = states_map.get(state_id)
-        
-            if state_instance:
-                municipalities_to_create.append(
-                    Municipality(
-                        id=data.id,
-                        nome=data.nome,
-                        estado=state_instance
-                    )
-                )   
-
-        if municipalities_to_create:
-            Municipality.objects.bulk_create(municipalities_to_create, batch_size=1000)
-        
-        logger.info(f'{len(municipalities_to_create)} new municipalities created.')
-
-    def _bulk_import_districts(self):
-        """
-        Bulk imports all districts.
-        """
-        logger.info('Bulk importing Districts...')
-        districts_data = self.client.get_all_districts()
-        
-        municipalities_map = {m.id: m for m in Municipality.objects.all()}
-        existing_ids = set(District.objects.values_list('id', flat=True))
-        
-        districts_to_create = []
-        for data in districts_data:
-            if data.id in existing_ids:
-                continue
-
-            municipality_id = data.municipio.id
-            municipality_instance = municipalities_map.get(municipality_id)
-            
-            if municipality_instance:
-                districts_to_create.append(
-                    District(
-                        id=data.id,
-                        nome=data.nome,
-                        municipio=municipality_instance
-                    )
-                )
-
-        if districts_to_create:
-            District.objects.bulk_create(districts_to_create, batch_size=1000)
-
-        logger.info(f'{len(districts_to_create)} new districts created.') 
-
+        if options['metrics_out']:
+            self.metrics.write(options['metrics_out'])
+        else:
+            self.metrics.log_summary()
+
+    def _timed_level(self, fetch_level):
+        """Fetches one level of the hierarchy and records it as a batch of the rows it received."""
+        started = time.perf_counter()
+        rows = fetch_level()
+        self.metrics.batch_done(len(rows), time.perf_counter() - started)
+        return rows
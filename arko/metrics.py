@@ -0,0 +1,236 @@
+import io
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_INTERVAL = 30 ## seconds
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Stage:
+    """
+    Times one pass through a stage. Time spent in nested stages is only counted for the nested stage.
+    Every thread nests its own stages, so concurrent stages add up to more than the wall time.
+    """
+
+    __slots__ = ('metrics', 'name', 'started', 'nested')
+
+    def __init__(self, metrics:'ImportMetrics', name:str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.nested = 0.0
+        self.started = time.perf_counter()
+        self.metrics._stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.started
+        stack = self.metrics._stack()
+        stack.pop()
+        self.metrics._record(self.name, elapsed - self.nested)
+        if stack:
+            stack[-1].nested+=elapsed
+
+
+class ImportMetrics:
+    """
+    Collects stage-level timings, rows, batch latencies and peak memory for an import command.
+    Emits a structured `import_metrics` log line every `log_interval` seconds and
+    a final summary that can also be written as JSON.
+    """
+
+    def __init__(self, command:str, log_interval:float=DEFAULT_LOG_INTERVAL, trace_memory:bool=False):
+        self.command = command
+        self.log_interval = log_interval
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.stage_seconds: Dict[str, float] = {}
+        self.stage_calls: Dict[str, int] = {}
+        self.batch_latencies: List[float] = []
+        self.peak_rss = 0
+        self.peak_traced: Optional[int] = None
+        self._last_log = self.started
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __getstate__(self):
+        # Sent back from pool workers once their archive is done; the stage stacks are always empty by then.
+        self.update_memory()
+        state = self.__dict__.copy()
+        del state['_local'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[_Stage]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def stage(self, name:str) -> _Stage:
+        return _Stage(self, name)
+
+    def _record(self, name:str, seconds:float):
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+
+    @contextmanager
+    def timed_exit(self, manager, stage_name:str):
+        """Enters `manager` untimed and times only its successful exit, e.g. the COMMIT of transaction.atomic()."""
+        value = manager.__enter__()
+        try:
+            yield value
+        except BaseException:
+            if not manager.__exit__(*sys.exc_info()):
+                raise
+        else:
+            with self.stage(stage_name):
+                manager.__exit__(None, None, None)
+
+    def batch_done(self, rows:int, seconds:float):
+        """Records a finished batch (a CSV chunk or an API level) and logs progress when due."""
+        self.rows+=rows
+        self.batch_latencies.append(seconds)
+        now = time.perf_counter()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            logger.info("import_metrics " + json.dumps(self.progress()))
+
+    def update_memory(self):
+        self.peak_rss = max(self.peak_rss, peak_rss_bytes())
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_traced = max(self.peak_traced or 0, tracemalloc.get_traced_memory()[1])
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def progress(self) -> dict:
+        elapsed = self.elapsed()
+        self.update_memory()
+        return {
+            'command': self.command,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed else 0.0,
+            'stage_seconds': {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()},
+            'peak_rss_bytes': self.peak_rss,
+        }
+
+    def merge(self, other:'ImportMetrics'):
+        """Adds the stages, rows and batches of another run (e.g. a pool worker) to this one."""
+        self.rows+=other.rows
+        for name, seconds in other.stage_seconds.items():
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            self.stage_calls[name] = self.stage_calls.get(name, 0) + other.stage_calls.get(name, 0)
+        self.batch_latencies.extend(other.batch_latencies)
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+        if other.peak_traced is not None:
+            self.peak_traced = max(self.peak_traced or 0, other.peak_traced)
+
+    def summary(self) -> dict:
+        elapsed = self.elapsed()
+        self.update_memory()
+        staged_seconds = sum(self.stage_seconds.values())
+
+        stages = {}
+        for name, seconds in sorted(self.stage_seconds.items(), key=lambda item: -item[1]):
+            stages[name] = {
+                'seconds': round(seconds, 3),
+                'calls': self.stage_calls[name],
+                'share': round(seconds / staged_seconds, 4) if staged_seconds else 0.0,
+                'rows_per_second': round(self.rows / seconds, 1) if seconds else None,
+            }
+
+        latencies = np.array(self.batch_latencies) if self.batch_latencies else None
+        return {
+            'command': self.command,
+            'started_at': self.started_at.isoformat(),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed else 0.0,
+            'stages': stages,
+            'batches': {
+                'count': len(self.batch_latencies),
+                'latency_seconds': {
+                    **{f'p{p}': round(float(np.percentile(latencies, p)), 4) for p in LATENCY_PERCENTILES},
+                    'max': round(float(latencies.max()), 4),
+                } if latencies is not None else {},
+            },
+            'memory': {
+                'peak_rss_bytes': self.peak_rss,
+                'peak_traced_bytes': self.peak_traced,
+            },
+        }
+
+    def log_summary(self) -> dict:
+        summary = self.summary()
+        logger.info("import_metrics_summary " + json.dumps(summary))
+        return summary
+
+    def write(self, path:str) -> dict:
+        summary = self.log_summary()
+        with open(path, 'w') as output:
+            json.dump(summary, output, indent=2)
+        logger.info(f"Import metrics written to {path}.")
+        return summary
+
+
+class TimedStream(io.BufferedIOBase):
+    """Binary stream proxy that accounts every read to a stage, e.g. ZIP decompression."""
+
+    def __init__(self, stream, metrics:ImportMetrics, stage_name:str):
+        super().__init__()
+        self._stream = stream
+        self._stage = metrics.stage(stage_name)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._stream.seekable()
+
+    def tell(self):
+        return self._stream.tell()
+
+    def read(self, size=-1):
+        with self._stage:
+            return self._stream.read(size)
+
+    def read1(self, size=-1):
+        with self._stage:
+            return self._stream.read1(size)
+
+    def readline(self, size=-1):
+        with self._stage:
+            return self._stream.readline(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        with self._stage:
+            return self._stream.seek(offset, whence)
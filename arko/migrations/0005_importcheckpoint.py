@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0004_company_porte_empresa_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archive', models.CharField(help_text='Nome do arquivo ZIP importado', max_length=255)),
+                ('csv_member', models.CharField(help_text='Nome do CSV dentro do ZIP', max_length=255)),
+                ('member_crc', models.BigIntegerField(help_text='CRC-32 do CSV no ZIP, identifica a versão do arquivo')),
+                ('chunk_index', models.IntegerField(help_text='Índice do lote (começando em 0)')),
+                ('row_count', models.IntegerField(help_text='Linhas lidas no lote')),
+                ('end_offset', models.BigIntegerField(help_text='Posição em bytes, no CSV descompactado, após o lote')),
+                ('content_hash', models.CharField(help_text='SHA-256 dos bytes do lote', max_length=64)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Importação',
+                'verbose_name_plural': 'Checkpoints de Importação',
+                'ordering': ['archive', 'chunk_index'],
+                'constraints': [models.UniqueConstraint(fields=('archive', 'csv_member', 'member_crc', 'chunk_index'), name='unique_import_checkpoint')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='content_fingerprint',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Hash de 64 bits do conteúdo da linha, usado na importação incremental', null=True),
+        ),
+    ]
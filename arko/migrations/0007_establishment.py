@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0006_company_content_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Establishment',
+            fields=[
+                ('cnpj', models.CharField(help_text='CNPJ completo, 14 digitos', max_length=14, primary_key=True, serialize=False)),
+                ('identificador_matriz_filial', models.CharField(help_text='1 - Matriz, 2 - Filial', max_length=1)),
+                ('nome_fantasia', models.CharField(blank=True, help_text='Nome Fantasia', max_length=255, null=True)),
+                ('situacao_cadastral', models.CharField(help_text='Situação Cadastral (01, 02, 03, 04, 08)', max_length=2)),
+                ('data_situacao_cadastral', models.DateField(blank=True, help_text='Data do evento da situação cadastral', null=True)),
+                ('motivo_situacao_cadastral', models.CharField(blank=True, help_text='Código do motivo da situação cadastral', max_length=2, null=True)),
+                ('data_inicio_atividade', models.DateField(blank=True, help_text='Data de início da atividade', null=True)),
+                ('cnae_fiscal_principal', models.CharField(blank=True, db_index=True, help_text='Código da atividade econômica principal', max_length=7, null=True)),
+                ('tipo_logradouro', models.CharField(blank=True, help_text='Tipo de Logradouro', max_length=20, null=True)),
+                ('logradouro', models.CharField(blank=True, help_text='Logradouro', max_length=255, null=True)),
+                ('numero', models.CharField(blank=True, help_text='Número', max_length=20, null=True)),
+                ('complemento', models.CharField(blank=True, help_text='Complemento', max_length=255, null=True)),
+                ('bairro', models.CharField(blank=True, help_text='Bairro', max_length=100, null=True)),
+                ('cep', models.CharField(blank=True, help_text='CEP', max_length=8, null=True)),
+                ('uf', models.CharField(blank=True, help_text='Sigla da UF', max_length=2, null=True)),
+                ('codigo_municipio', models.CharField(blank=True, help_text='Código do município na Receita (tabela SIAFI)', max_length=4, null=True)),
+                ('empresa', models.ForeignKey(db_column='cnpj_basico', db_constraint=False, help_text='CNPJ básico da empresa; o arquivo de Empresas pode ser importado depois', on_delete=django.db.models.deletion.DO_NOTHING, related_name='estabelecimentos', to='arko.company')),
+                ('municipio', models.ForeignKey(blank=True, help_text='Município do IBGE correspondente ao código da Receita', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='estabelecimentos', to='arko.municipality')),
+            ],
+            options={
+                'verbose_name': 'Estabelecimento',
+                'verbose_name_plural': 'Estabelecimentos',
+                'ordering': ['cnpj'],
+            },
+        ),
+    ]
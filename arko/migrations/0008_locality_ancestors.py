@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_ancestors(apps, schema_editor):
+    """Copies the ancestors of the localities already imported, until the next IBGE import maintains them."""
+    State = apps.get_model('arko', 'State')
+    Municipality = apps.get_model('arko', 'Municipality')
+    District = apps.get_model('arko', 'District')
+
+    Municipality.objects.update(
+        regiao_id=Subquery(State.objects.filter(id=OuterRef('estado_id')).values('regiao_id')[:1])
+    )
+    municipalities = Municipality.objects.filter(id=OuterRef('municipio_id'))
+    District.objects.update(
+        estado_id=Subquery(municipalities.values('estado_id')[:1]),
+        regiao_id=Subquery(municipalities.values('regiao_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0007_establishment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='district',
+            name='estado',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='distritos', to='arko.state'),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='regiao',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='distritos', to='arko.region'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='regiao',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='municipios', to='arko.region'),
+        ),
+        migrations.RunPython(fill_ancestors, migrations.RunPython.noop),
+    ]
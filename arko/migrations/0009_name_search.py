@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+import re
+import unicodedata
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+BATCH_SIZE = 20000
+NON_ALPHANUMERIC = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize_name(name):
+    """
+    Frozen copy of arko.transforms.normalize_names as of this migration: uppercase, without
+    accents, with every run of other characters turned into one space.
+    """
+    if name is None:
+        return None
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', errors='ignore').decode('ascii')
+    return NON_ALPHANUMERIC.sub(' ', ascii_name.upper()).strip()
+
+
+def fill_normalized_names(apps, schema_editor):
+    """Normalizes the names already stored, in primary key batches, before the search indexes are built."""
+    connection = schema_editor.connection
+    for model_name, source, target in (
+        ('Municipality', 'nome', 'nome_normalizado'),
+        ('District', 'nome', 'nome_normalizado'),
+        ('Company', 'razao_social', 'razao_social_normalizada'),
+    ):
+        model = apps.get_model('arko', model_name)
+        table = connection.ops.quote_name(model._meta.db_table)
+        key = connection.ops.quote_name(model._meta.pk.column)
+        last = None
+        while True:
+            # Also with a replica configured, read from the database being migrated.
+            rows = model.objects.using(connection.alias).order_by('pk')
+            if last is not None:
+                rows = rows.filter(pk__gt=last)
+            batch = list(rows.values_list('pk', source)[:BATCH_SIZE])
+            if not batch:
+                break
+            keys, names = zip(*batch)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} AS t SET {connection.ops.quote_name(target)} = v.name "
+                    f"FROM unnest(%s, %s) AS v(key, name) WHERE t.{key} = v.key",
+                    [list(keys), [normalize_name(name) for name in names]]
+                )
+            last = keys[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0008_locality_ancestors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='razao_social_normalizada',
+            field=models.CharField(blank=True, editable=False, help_text='Razão social sem acentos e pontuação, em maiúsculas, usada na busca', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='nome_normalizado',
+            field=models.CharField(editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='nome_normalizado',
+            field=models.CharField(editable=False, max_length=200, null=True),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['razao_social_normalizada'], name='arko_empresa_busca_prefixo', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('razao_social_normalizada', config='simple'), name='arko_empresa_busca_texto'),
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=models.Index(fields=['nome_normalizado'], name='arko_distrito_busca_prefixo', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('nome_normalizado', config='simple'), name='arko_distrito_busca_texto'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['nome_normalizado'], name='arko_municipio_busca_prefixo', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('nome_normalizado', config='simple'), name='arko_municipio_busca_texto'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0009_name_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(help_text="Conjunto de dados, ex.: 'ibge' ou 'companies'", max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField(default=0, help_text='Incrementada a cada importação que altera os dados')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Momento da última alteração')),
+            ],
+            options={
+                'verbose_name': 'Versão dos Dados',
+                'verbose_name_plural': 'Versões dos Dados',
+            },
+        ),
+    ]
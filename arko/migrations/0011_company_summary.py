@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+# One row per combination of the dimensions, each either fixed or rolled up. Rolled-up
+# dimensions and a missing porte_empresa are stored as '', told apart by `agregados`, so that
+# `chave` is unique and non-null, which REFRESH ... CONCURRENTLY requires.
+CREATE_SUMMARY = """
+CREATE MATERIALIZED VIEW arko_resumo_empresas AS
+SELECT
+    concat_ws(':',
+        GROUPING(porte_empresa, natureza_juridica, qualificacao_responsavel),
+        COALESCE(porte_empresa, ''), COALESCE(natureza_juridica, ''), COALESCE(qualificacao_responsavel, '')
+    )::varchar(20) AS chave,
+    GROUPING(porte_empresa, natureza_juridica, qualificacao_responsavel) AS agregados,
+    COALESCE(porte_empresa, '')::varchar(2) AS porte_empresa,
+    COALESCE(natureza_juridica, '')::varchar(4) AS natureza_juridica,
+    COALESCE(qualificacao_responsavel, '')::varchar(2) AS qualificacao_responsavel,
+    count(*) AS empresas,
+    sum(capital_social)::numeric(24, 2) AS capital_total,
+    avg(capital_social)::numeric(18, 2) AS capital_medio,
+    percentile_cont(0.25) WITHIN GROUP (ORDER BY capital_social)::numeric(18, 2) AS capital_p25,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY capital_social)::numeric(18, 2) AS capital_mediana,
+    percentile_cont(0.75) WITHIN GROUP (ORDER BY capital_social)::numeric(18, 2) AS capital_p75,
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY capital_social)::numeric(18, 2) AS capital_p90
+FROM arko_company
+GROUP BY CUBE (porte_empresa, natureza_juridica, qualificacao_responsavel);
+
+CREATE UNIQUE INDEX arko_resumo_empresas_chave ON arko_resumo_empresas (chave);
+CREATE INDEX arko_resumo_empresas_dimensoes
+    ON arko_resumo_empresas (agregados, porte_empresa, natureza_juridica, qualificacao_responsavel);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0010_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanySummary',
+            fields=[
+                ('chave', models.CharField(help_text="Agrupamento e valores das dimensões, ex.: '1:03:2062:'", max_length=20, primary_key=True, serialize=False)),
+                ('agregados', models.IntegerField(help_text='Bitmask GROUPING() das dimensões agregadas')),
+                ('porte_empresa', models.CharField(max_length=2)),
+                ('natureza_juridica', models.CharField(max_length=4)),
+                ('qualificacao_responsavel', models.CharField(max_length=2)),
+                ('empresas', models.BigIntegerField(help_text='Quantidade de empresas')),
+                ('capital_total', models.DecimalField(decimal_places=2, max_digits=24)),
+                ('capital_medio', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('capital_p25', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('capital_mediana', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('capital_p75', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('capital_p90', models.DecimalField(decimal_places=2, max_digits=18)),
+            ],
+            options={
+                'verbose_name': 'Resumo de Empresas',
+                'verbose_name_plural': 'Resumos de Empresas',
+                'db_table': 'arko_resumo_empresas',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_SUMMARY, 'DROP MATERIALIZED VIEW arko_resumo_empresas;'),
+    ]
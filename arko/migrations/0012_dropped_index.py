@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arko', '0011_company_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DroppedIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(help_text='Tabela do índice', max_length=63)),
+                ('name', models.CharField(help_text='Nome do índice', max_length=63, unique=True)),
+                ('definition', models.TextField(help_text='Comando CREATE INDEX que recria o índice (pg_get_indexdef)')),
+                ('dropped_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Índice Removido',
+                'verbose_name_plural': 'Índices Removidos',
+                'ordering': ['table', 'name'],
+            },
+        ),
+    ]
@@ -1,5 +1,24 @@
 # locations/models.py
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, models
+from django.db.models import F
+from django.utils import timezone
+
+# Text search configuration of the name search indexes: no stemming or stop words, since
+# the indexed names are already unaccented and uppercased.
+SEARCH_CONFIG = 'simple'
+
+
+def name_search_indexes(prefix:str, field:str) -> list:
+    """
+    The indexes behind the name search: a pattern-ops B-tree for prefix matches (LIKE 'X%')
+    and a GIN full-text index for word-prefix matches anywhere in the name.
+    """
+    return [
+        models.Index(fields=[field], name=f'{prefix}_busca_prefixo', opclasses=['varchar_pattern_ops']),
+        GinIndex(SearchVector(field, config=SEARCH_CONFIG), name=f'{prefix}_busca_texto'),
+    ]
 
 class Region(models.Model):
     id = models.IntegerField(primary_key=True)
@@ -31,11 +50,15 @@ class Municipality(models.Model):
     id = models.IntegerField(primary_key=True)
     nome = models.CharField(max_length=200)
     estado = models.ForeignKey(State, on_delete=models.PROTECT, related_name='municipios')
+    # Ancestor copied from the state, kept in sync by the IBGE import, so rollups per region skip the joins.
+    regiao = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='municipios', null=True, editable=False)
+    nome_normalizado = models.CharField(max_length=200, null=True, editable=False)
 
     class Meta:
         verbose_name = 'Municipio'
         verbose_name_plural = 'Municipios'
         ordering = ['nome']
+        indexes = name_search_indexes('arko_municipio', 'nome_normalizado')
 
     def __str__(self):
         return self.nome
@@ -44,11 +67,17 @@ class District(models.Model):
     id = models.IntegerField(primary_key=True)
     nome = models.CharField(max_length=200)
     municipio = models.ForeignKey(Municipality, on_delete=models.PROTECT, related_name='distritos')
+    # Ancestors copied from the municipality, kept in sync by the IBGE import, so filters and
+    # rollups by state or region are a single index scan instead of a chain of joins.
+    estado = models.ForeignKey(State, on_delete=models.PROTECT, related_name='distritos', null=True, editable=False)
+    regiao = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='distritos', null=True, editable=False)
+    nome_normalizado = models.CharField(max_length=200, null=True, editable=False)
 
     class Meta:
         verbose_name = 'Distritos'
         verbose_name_plural = 'Distritos'
         ordering = ['nome']
+        indexes = name_search_indexes('arko_distrito', 'nome_normalizado')
 
     def __str__(self):
         return self.nome
@@ -61,11 +90,166 @@ class Company(models.Model):
     capital_social = models.DecimalField(max_digits=16, help_text="Porte da Empresa (01, 03, 05)", decimal_places=2)
     porte_empresa = models.CharField(max_length=2, help_text="Porte da Empresa (01, 03, 05)", null=True, blank=True)
     ente_federativo_responsavel = models.CharField(max_length=255, blank=True, null=True, help_text="Ente Federativo Responsável")
+    content_fingerprint = models.BigIntegerField(null=True, blank=True, editable=False, help_text="Hash de 64 bits do conteúdo da linha, usado na importação incremental")
+    razao_social_normalizada = models.CharField(max_length=255, null=True, blank=True, editable=False, help_text="Razão social sem acentos e pontuação, em maiúsculas, usada na busca")
 
     class Meta:
         verbose_name = 'Empresa'
         verbose_name_plural = 'Empresas'
         ordering = ['razao_social']
+        indexes = name_search_indexes('arko_empresa', 'razao_social_normalizada')
     
     def __str__(self):
-        return self.razao_social
\ No newline at end of file
+        return self.razao_social
+
+class ImportCheckpoint(models.Model):
+    archive = models.CharField(max_length=255, help_text="Nome do arquivo ZIP importado")
+    csv_member = models.CharField(max_length=255, help_text="Nome do CSV dentro do ZIP")
+    member_crc = models.BigIntegerField(help_text="CRC-32 do CSV no ZIP, identifica a versão do arquivo")
+    chunk_index = models.IntegerField(help_text="Índice do lote (começando em 0)")
+    row_count = models.IntegerField(help_text="Linhas lidas no lote")
+    end_offset = models.BigIntegerField(help_text="Posição em bytes, no CSV descompactado, após o lote")
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 dos bytes do lote")
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Checkpoint de Importação'
+        verbose_name_plural = 'Checkpoints de Importação'
+        ordering = ['archive', 'chunk_index']
+        constraints = [
+            models.UniqueConstraint(fields=['archive', 'csv_member', 'member_crc', 'chunk_index'], name='unique_import_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f'{self.archive}:{self.csv_member} #{self.chunk_index}'
+
+class DroppedIndex(models.Model):
+    table = models.CharField(max_length=63, help_text="Tabela do índice")
+    name = models.CharField(max_length=63, unique=True, help_text="Nome do índice")
+    definition = models.TextField(help_text="Comando CREATE INDEX que recria o índice (pg_get_indexdef)")
+    dropped_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Índice Removido'
+        verbose_name_plural = 'Índices Removidos'
+        ordering = ['table', 'name']
+
+    def __str__(self):
+        return f'{self.table}.{self.name}'
+
+class Establishment(models.Model):
+    cnpj = models.CharField(max_length=14, primary_key=True, help_text="CNPJ completo, 14 digitos")
+    empresa = models.ForeignKey(
+        Company, on_delete=models.DO_NOTHING, db_constraint=False, db_column='cnpj_basico',
+        related_name='estabelecimentos', help_text="CNPJ básico da empresa; o arquivo de Empresas pode ser importado depois"
+    )
+    identificador_matriz_filial = models.CharField(max_length=1, help_text="1 - Matriz, 2 - Filial")
+    nome_fantasia = models.CharField(max_length=255, null=True, blank=True, help_text="Nome Fantasia")
+    situacao_cadastral = models.CharField(max_length=2, help_text="Situação Cadastral (01, 02, 03, 04, 08)")
+    data_situacao_cadastral = models.DateField(null=True, blank=True, help_text="Data do evento da situação cadastral")
+    motivo_situacao_cadastral = models.CharField(max_length=2, null=True, blank=True, help_text="Código do motivo da situação cadastral")
+    data_inicio_atividade = models.DateField(null=True, blank=True, help_text="Data de início da atividade")
+    cnae_fiscal_principal = models.CharField(max_length=7, null=True, blank=True, db_index=True, help_text="Código da atividade econômica principal")
+    tipo_logradouro = models.CharField(max_length=20, null=True, blank=True, help_text="Tipo de Logradouro")
+    logradouro = models.CharField(max_length=255, null=True, blank=True, help_text="Logradouro")
+    numero = models.CharField(max_length=20, null=True, blank=True, help_text="Número")
+    complemento = models.CharField(max_length=255, null=True, blank=True, help_text="Complemento")
+    bairro = models.CharField(max_length=100, null=True, blank=True, help_text="Bairro")
+    cep = models.CharField(max_length=8, null=True, blank=True, help_text="CEP")
+    uf = models.CharField(max_length=2, null=True, blank=True, help_text="Sigla da UF")
+    codigo_municipio = models.CharField(max_length=4, null=True, blank=True, help_text="Código do município na Receita (tabela SIAFI)")
+    municipio = models.ForeignKey(
+        Municipality, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='estabelecimentos', help_text="Município do IBGE correspondente ao código da Receita"
+    )
+
+    class Meta:
+        verbose_name = 'Estabelecimento'
+        verbose_name_plural = 'Estabelecimentos'
+        ordering = ['cnpj']
+
+    def __str__(self):
+        return self.nome_fantasia or self.cnpj
+
+
+# DataVersion of the regions, states, municipalities and districts loaded by populate_ibge.
+IBGE_DATA = 'ibge'
+# DataVersion of the companies, bumped by populate_companies (its `entity_plural`).
+COMPANY_DATA = 'companies'
+
+
+class DataVersion(models.Model):
+    """
+    Version of a data set, bumped by the import command that loads it whenever it changes
+    something. Views derive their cache keys, ETag and Last-Modified from it.
+    """
+    name = models.CharField(max_length=50, primary_key=True, help_text="Conjunto de dados, ex.: 'ibge' ou 'companies'")
+    version = models.PositiveIntegerField(default=0, help_text="Incrementada a cada importação que altera os dados")
+    updated_at = models.DateTimeField(default=timezone.now, help_text="Momento da última alteração")
+
+    class Meta:
+        verbose_name = 'Versão dos Dados'
+        verbose_name_plural = 'Versões dos Dados'
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+    @classmethod
+    def current(cls, name:str) -> 'DataVersion':
+        """The stored version, or an unsaved version 0 for data that was never imported."""
+        return cls.objects.filter(name=name).first() or cls(name=name, updated_at=None)
+
+    @classmethod
+    def bump(cls, name:str) -> 'DataVersion':
+        cls.objects.get_or_create(name=name)
+        cls.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+        return cls.objects.get(name=name)
+
+
+class CompanySummary(models.Model):
+    """
+    Company count and capital_social statistics for every combination of porte_empresa,
+    natureza_juridica and qualificacao_responsavel, each either fixed or rolled up
+    (GROUP BY CUBE), read from a materialized view created by migration 0011.
+
+    `agregados` is the GROUPING() bitmask of the rolled-up dimensions (see `grouping`),
+    and a rolled-up dimension is stored as ''; so is a missing porte_empresa.
+    """
+    # Order of the CUBE: the first dimension is the most significant bit of `agregados`.
+    DIMENSIONS = ['porte_empresa', 'natureza_juridica', 'qualificacao_responsavel']
+
+    chave = models.CharField(max_length=20, primary_key=True, help_text="Agrupamento e valores das dimensões, ex.: '1:03:2062:'")
+    agregados = models.IntegerField(help_text="Bitmask GROUPING() das dimensões agregadas")
+    porte_empresa = models.CharField(max_length=2)
+    natureza_juridica = models.CharField(max_length=4)
+    qualificacao_responsavel = models.CharField(max_length=2)
+    empresas = models.BigIntegerField(help_text="Quantidade de empresas")
+    capital_total = models.DecimalField(max_digits=24, decimal_places=2)
+    capital_medio = models.DecimalField(max_digits=18, decimal_places=2)
+    capital_p25 = models.DecimalField(max_digits=18, decimal_places=2)
+    capital_mediana = models.DecimalField(max_digits=18, decimal_places=2)
+    capital_p75 = models.DecimalField(max_digits=18, decimal_places=2)
+    capital_p90 = models.DecimalField(max_digits=18, decimal_places=2)
+
+    class Meta:
+        managed = False
+        db_table = 'arko_resumo_empresas'
+        verbose_name = 'Resumo de Empresas'
+        verbose_name_plural = 'Resumos de Empresas'
+
+    def __str__(self):
+        return self.chave
+
+    @classmethod
+    def grouping(cls, dimensions) -> int:
+        """`agregados` of the rows grouped by `dimensions`, with every other dimension rolled up."""
+        return sum(1 << (len(cls.DIMENSIONS) - 1 - position) for position, dimension in enumerate(cls.DIMENSIONS) if dimension not in dimensions)
+
+    @classmethod
+    def refresh(cls, concurrently:bool=True):
+        """
+        Recomputes the view. Concurrently, readers keep the previous contents until it
+        finishes instead of waiting on an exclusive lock.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{cls._meta.db_table}")
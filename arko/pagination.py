@@ -0,0 +1,195 @@
+import base64
+import json
+import logging
+from typing import List, Optional, Sequence, Tuple
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import CharField, DecimalField, FloatField, IntegerField, Q, QuerySet, TextField
+from django.http import Http404
+
+logger = logging.getLogger(__name__)
+
+# Above this many rows the total shown is the planner estimate, since an exact
+# count(*) would scan the whole filtered set on every request.
+EXACT_COUNT_LIMIT = 10000
+
+
+def encode_cursor(values:Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), ensure_ascii=False, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token:str) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise Http404("Cursor de paginação inválido.")
+    if not isinstance(values, list):
+        raise Http404("Cursor de paginação inválido.")
+    return values
+
+
+def count_up_to(queryset:QuerySet, limit:int) -> int:
+    """Counts the rows of the queryset, stopping at `limit` + 1 so a broad filter never scans everything."""
+    return queryset.order_by().values('pk')[:limit + 1].count()
+
+
+async def acount_up_to(queryset:QuerySet, limit:int) -> int:
+    return await queryset.order_by().values('pk')[:limit + 1].acount()
+
+
+def estimate_count(queryset:QuerySet) -> Optional[int]:
+    """Row estimate of the planner for the queryset, read from EXPLAIN without running it."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """
+    A page of a KeysetPaginator. Mirrors the parts of Django's Page used by the templates
+    (`object_list`, `has_next`, `has_previous`, `has_other_pages`), with opaque cursors instead of page numbers.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator:'KeysetPaginator', has_next:bool, has_previous:bool):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        return self.paginator.cursor_for(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self) -> Optional[str]:
+        return self.paginator.cursor_for(self.object_list[0]) if self._has_previous else None
+
+
+def _ordering_field(field:str):
+    """('razao_social', False) for 'razao_social', ('relevancia', True) for '-relevancia'."""
+    return (field[1:], True) if field.startswith('-') else (field, False)
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over a queryset ordered by `ordering` (fields or annotations, descending
+    with a leading '-'), whose last field must be unique.
+    A page is located with a range condition on the ordering columns of the row it starts
+    after (or ends before), so every page costs the same index scan, however deep it is.
+
+    `count` is exact up to EXACT_COUNT_LIMIT rows; above it, it is the planner estimate and
+    `count_is_estimate` is set.
+    """
+
+    def __init__(self, queryset:QuerySet, per_page:int, ordering:Sequence[str]):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self._count = None
+        self._count_is_estimate = False
+
+    def cursor_for(self, obj) -> str:
+        return encode_cursor([getattr(obj, _ordering_field(field)[0]) for field in self.ordering])
+
+    def cursor_types(self, field:str) -> Optional[tuple]:
+        """The JSON types a cursor value of `field` (a model field or an annotation) may have, None if unchecked."""
+        annotation = self.queryset.query.annotations.get(field)
+        output = annotation.output_field if annotation is not None else self.queryset.model._meta.get_field(field)
+        if isinstance(output, (CharField, TextField)):
+            return (str,)
+        if isinstance(output, IntegerField):
+            return (int,)
+        if isinstance(output, (FloatField, DecimalField)):
+            return (int, float)
+        return None
+
+    def seek(self, values:List, forward:bool) -> Q:
+        """
+        Rows after (or before) `values` in the ordering. The leading column gets a plain range
+        condition, so the index on it bounds the scan; the remaining columns break the ties.
+        """
+        if len(values) != len(self.ordering):
+            raise Http404("Cursor de paginação inválido.")
+        fields = [_ordering_field(field) for field in self.ordering]
+        # A value of the wrong type would only fail in the database, as a 500.
+        for (field, _), value in zip(fields, values):
+            types = self.cursor_types(field)
+            if isinstance(value, bool) or (types is not None and not isinstance(value, types)):
+                raise Http404("Cursor de paginação inválido.")
+
+        def operator(descending):
+            return 'gt' if forward != descending else 'lt'
+
+        condition = Q()
+        for position, (field, descending) in enumerate(fields):
+            ties = {name: value for (name, _), value in zip(fields[:position], values[:position])}
+            condition |= Q(**ties, **{f'{field}__{operator(descending)}': values[position]})
+        leading, descending = fields[0]
+        return Q(**{f'{leading}__{operator(descending)}e': values[0]}) & condition
+
+    def _page_query(self, after:Optional[str], before:Optional[str]) -> Tuple[QuerySet, bool]:
+        """The per_page + 1 rows after `after`, or before `before` in reverse order (flagged by the bool)."""
+        if before:
+            queryset = self.queryset.filter(self.seek(decode_cursor(before), forward=False))
+            reversed_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+            return queryset.order_by(*reversed_ordering)[:self.per_page + 1], True
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self.seek(decode_cursor(after), forward=True))
+        return queryset.order_by(*self.ordering)[:self.per_page + 1], False
+
+    def _make_page(self, rows:List, after:Optional[str], backwards:bool) -> KeysetPage:
+        if backwards:
+            return KeysetPage(rows[:self.per_page][::-1], self, has_next=bool(rows), has_previous=len(rows) > self.per_page)
+        return KeysetPage(rows[:self.per_page], self, has_next=len(rows) > self.per_page, has_previous=bool(after and rows))
+
+    def page(self, after:Optional[str]=None, before:Optional[str]=None) -> KeysetPage:
+        queryset, backwards = self._page_query(after, before)
+        return self._make_page(list(queryset), after, backwards)
+
+    async def apage(self, after:Optional[str]=None, before:Optional[str]=None) -> KeysetPage:
+        """page() through the async ORM."""
+        queryset, backwards = self._page_query(after, before)
+        return self._make_page([row async for row in queryset.aiterator()], after, backwards)
+
+    @property
+    def count(self) -> int:
+        if self._count is None:
+            self._count = count_up_to(self.queryset, EXACT_COUNT_LIMIT)
+            if self._count > EXACT_COUNT_LIMIT:
+                self._count = max(estimate_count(self.queryset) or 0, self._count)
+                self._count_is_estimate = True
+        return self._count
+
+    async def acount(self) -> int:
+        """count through the async ORM; the estimate reads EXPLAIN, which has no async variant."""
+        if self._count is None:
+            count = await acount_up_to(self.queryset, EXACT_COUNT_LIMIT)
+            if count > EXACT_COUNT_LIMIT:
+                count = max(await sync_to_async(estimate_count)(self.queryset) or 0, count)
+                self._count_is_estimate = True
+            self._count = count
+        return self._count
+
+    @property
+    def count_is_estimate(self) -> bool:
+        self.count
+        return self._count_is_estimate
@@ -0,0 +1,280 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+# A query run this many times in one request, with different parameters, is reported as a likely N+1.
+DUPLICATE_QUERY_THRESHOLD = 3
+# Slowest queries kept per profiled request.
+SLOW_QUERIES_KEPT = 5
+PANEL_PATH = '/app/_perf/'
+
+_current_profile = contextvars.ContextVar('arko_request_profile', default=None)
+
+
+class QueryStats:
+    __slots__ = ('sql', 'alias', 'count', 'total_ms', 'max_ms', 'max_params', 'distinct_params')
+
+    def __init__(self, sql:str, alias:str):
+        self.sql = sql
+        self.alias = alias
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.max_params = None
+        self.distinct_params = set()
+
+
+class RequestProfile:
+    """
+    SQL, template and total timings of one request. Queries are grouped by their SQL text,
+    which Django keeps parametrized, so the same statement run once per row of a list stands
+    out as a single group with a high count.
+    """
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.get_full_path()
+        self.view_name = None
+        self.status_code = None
+        self.started_at = datetime.now(timezone.utc)
+        self.queries:Dict[str, QueryStats] = {}
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self.explain:Optional[str] = None
+        self.explained_sql:Optional[str] = None
+        self._render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper() hook timing every query of the request."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            alias = context['connection'].alias
+            stats = self.queries.get(sql)
+            if stats is None:
+                stats = self.queries[sql] = QueryStats(sql, alias)
+            stats.count+=1
+            stats.total_ms+=elapsed
+            if elapsed > stats.max_ms:
+                stats.max_ms = elapsed
+                stats.max_params = None if many else params
+            if stats.count <= DUPLICATE_QUERY_THRESHOLD:
+                stats.distinct_params.add(repr(params))
+            self.query_count+=1
+            self.db_ms+=elapsed
+
+    @property
+    def duplicates(self) -> List[QueryStats]:
+        """Statements run at least DUPLICATE_QUERY_THRESHOLD times with varying parameters (N+1 suspects)."""
+        return sorted(
+            (stats for stats in self.queries.values() if stats.count >= DUPLICATE_QUERY_THRESHOLD and len(stats.distinct_params) > 1),
+            key=lambda stats: stats.count, reverse=True
+        )
+
+    @property
+    def slowest_queries(self) -> List[QueryStats]:
+        return sorted(self.queries.values(), key=lambda stats: stats.max_ms, reverse=True)[:SLOW_QUERIES_KEPT]
+
+    def explain_slowest(self, threshold_ms:float):
+        """
+        Stores EXPLAIN (ANALYZE, BUFFERS) of the slowest SELECT above `threshold_ms`. ANALYZE runs
+        the query once more, inside a savepoint that is always rolled back.
+        """
+        candidates = [
+            stats for stats in self.slowest_queries
+            if stats.max_ms >= threshold_ms and stats.sql.lstrip().upper().startswith('SELECT')
+        ]
+        if not candidates or connections[candidates[0].alias].vendor != 'postgresql':
+            return
+        stats = candidates[0]
+        try:
+            with transaction.atomic(using=stats.alias), connections[stats.alias].cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {stats.sql}', stats.max_params)
+                self.explain = '\n'.join(row[0] for row in cursor.fetchall())
+                self.explained_sql = stats.sql
+                transaction.set_rollback(True, using=stats.alias)
+        except Exception as e:
+            logger.warning(f"Could not explain a slow query of {self.path}: {e}")
+
+
+class SlowRequestLog:
+    """The `size` slowest profiled requests of the last `window` seconds, kept per process."""
+
+    def __init__(self, size:int, window:float):
+        self.size = size
+        self.window = window
+        self.profiled = 0
+        self.by_view:Dict[str, dict] = {}
+        self._profiles:List[RequestProfile] = []
+        self._lock = threading.Lock()
+
+    def would_keep(self, total_ms:float) -> bool:
+        """Whether a request this slow would enter the log, so EXPLAIN is only paid for requests that are kept."""
+        with self._lock:
+            self._expire()
+            return len(self._profiles) < self.size or total_ms > self._profiles[-1].total_ms
+
+    def record(self, profile:RequestProfile):
+        """Adds the request to the per-view totals."""
+        with self._lock:
+            self.profiled+=1
+            view = self.by_view.setdefault(profile.view_name or profile.path, {
+                'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_ms': 0.0, 'queries': 0, 'render_ms': 0.0,
+            })
+            view['requests']+=1
+            view['total_ms']+=profile.total_ms
+            view['max_ms'] = max(view['max_ms'], profile.total_ms)
+            view['db_ms']+=profile.db_ms
+            view['queries']+=profile.query_count
+            view['render_ms']+=profile.render_ms
+
+    def keep(self, profile:RequestProfile):
+        with self._lock:
+            self._expire()
+            self._profiles.append(profile)
+            self._profiles.sort(key=lambda kept: kept.total_ms, reverse=True)
+            del self._profiles[self.size:]
+
+    def slowest(self) -> List[RequestProfile]:
+        with self._lock:
+            self._expire()
+            return list(self._profiles)
+
+    def views(self) -> List[dict]:
+        """Per-view averages of every profiled request since the process started, slowest first."""
+        with self._lock:
+            rows = [
+                {
+                    'view': name, 'requests': view['requests'], 'max_ms': view['max_ms'],
+                    **{f'avg_{key}': view[key] / view['requests'] for key in ('total_ms', 'db_ms', 'queries', 'render_ms')},
+                }
+                for name, view in self.by_view.items()
+            ]
+        return sorted(rows, key=lambda row: row['avg_total_ms'], reverse=True)
+
+    def _expire(self):
+        cutoff = time.time() - self.window
+        self._profiles = [profile for profile in self._profiles if profile.started_at.timestamp() >= cutoff]
+
+
+slow_requests = SlowRequestLog(settings.PERF_SLOWEST_REQUESTS, settings.PERF_WINDOW_SECONDS)
+
+
+def _profiled_render(render):
+    """Wraps Template.render to time the outermost template of the profiled request; includes are part of it."""
+    def wrapper(self, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return render(self, context)
+        profile._render_depth+=1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile._render_depth-=1
+            if profile._render_depth == 0:
+                profile.render_ms+=(time.perf_counter() - started) * 1000
+    wrapper.profiled = True
+    return wrapper
+
+
+class PerfMiddleware:
+    """
+    Opt-in request profiler. A PERF_SAMPLE_RATE share of the requests records its query
+    count, DB time, repeated statements, template render time and total latency in
+    `slow_requests`, shown at /app/_perf/. Requests that are not sampled only pay for a
+    random() call, so a low rate can stay on in production. Disabled when the rate is 0.
+
+    Sync and async capable: under ASGI, requests stay on the event loop and only the
+    sampled ones hop to the request's sync thread to install the query hooks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PERF_SAMPLE_RATE
+        self.explain_threshold_ms = settings.PERF_EXPLAIN_THRESHOLD_MS
+        if not getattr(Template.render, 'profiled', False):
+            Template.render = _profiled_render(Template.render)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.hook_connections(stack, profile)
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        # Streaming responses are measured up to their first byte; their rows are read afterwards.
+        profile.total_ms = (time.perf_counter() - started) * 1000
+        self.finish(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        stack = ExitStack()
+        try:
+            # Database connections are per thread: the ORM, from sync or async views alike, runs
+            # on the request's sync thread, so the hooks are installed and removed there.
+            await sync_to_async(self.hook_connections)(stack, profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current_profile.reset(token)
+        profile.total_ms = (time.perf_counter() - started) * 1000
+        await sync_to_async(self.finish)(request, response, profile)
+        return response
+
+    def sampled(self, request) -> bool:
+        return random.random() < self.sample_rate and not request.path.startswith(PANEL_PATH)
+
+    @staticmethod
+    def hook_connections(stack:ExitStack, profile:RequestProfile):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+
+    def finish(self, request, response, profile:RequestProfile):
+        """Records the request, and stores the EXPLAIN of its slowest query if it is slow enough to be kept."""
+        profile.status_code = response.status_code
+        profile.view_name = request.resolver_match.view_name if request.resolver_match else None
+
+        slow_requests.record(profile)
+        if slow_requests.would_keep(profile.total_ms):
+            profile.explain_slowest(self.explain_threshold_ms)
+            slow_requests.keep(profile)
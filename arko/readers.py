@@ -0,0 +1,182 @@
+import csv
+import io
+import logging
+import zipfile
+from typing import Dict, Iterator, List
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QUOTE = ord('"')
+SEPARATOR = ord(';')
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024 ## bytes
+MIN_BATCH_ROWS = 1000
+# A decoded Python str plus its slot in an object column, per field.
+DECODED_FIELD_BYTES = 80
+# The widest column is gathered through an int64 index matrix and a mask of the same shape,
+# then widened to UCS-4 for decoding.
+GATHER_BYTES_PER_WIDTH = 14
+AVERAGE_LINE_BYTES = 128
+
+
+def find_csv_member(zf:zipfile.ZipFile, marker:str) -> str:
+    """Finds the CSV member of a Receita ZIP by the marker in its name, e.g. 'EMPRECSV'."""
+    csv_filename = next((name for name in zf.namelist() if marker in name.upper()), None)
+    if not csv_filename:
+        raise FileNotFoundError(f"No '{marker}' CSV file found in the ZIP archive.")
+    return csv_filename
+
+
+class ReceitaCsvReader:
+    """
+    Constant-memory reader for the Receita `;`-separated, double-quoted latin-1 CSVs.
+
+    Reads the (compressed) binary stream in blocks, cuts them at line boundaries and
+    splits the fields with vectorized NumPy operations into fixed-width column buffers
+    that are allocated once and reused for every batch. Only the current batch is ever
+    decoded into Python strings, and the batch size is derived from `memory_budget`.
+    Lines that do not follow the plain quoted layout (escaped quotes, missing fields)
+    are parsed with the csv module instead.
+
+    `widths` gives the buffer width, in bytes, of each column. Longer values are cut
+    at that width, so it should be one byte over the model max_length to keep the
+    validation able to reject them.
+    """
+
+    def __init__(self, stream, columns:List[str], widths:Dict[str, int],
+                 memory_budget:int=DEFAULT_MEMORY_BUDGET, encoding:str='latin-1'):
+        self.stream = stream
+        self.columns = columns
+        self.widths = [widths[column] for column in columns]
+        self.encoding = encoding
+
+        row_bytes = (
+            2 * sum(self.widths)
+            + GATHER_BYTES_PER_WIDTH * max(self.widths)
+            + DECODED_FIELD_BYTES * len(columns)
+            + AVERAGE_LINE_BYTES
+        )
+        self.rows_per_batch = max(MIN_BATCH_ROWS, memory_budget // row_bytes)
+        self.read_size = self.rows_per_batch * AVERAGE_LINE_BYTES
+
+        self._buffers = [np.zeros(self.rows_per_batch, dtype=f'S{width}') for width in self.widths]
+        logger.info(
+            f"Streaming reader: {self.rows_per_batch} rows per batch "
+            f"for a memory budget of {memory_budget // (1024 * 1024)} MB."
+        )
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for block in self._iter_blocks():
+            yield from self.parse_batches(block)
+
+    def _iter_blocks(self) -> Iterator[bytes]:
+        """Reads the stream in fixed-size blocks that always end at a line boundary."""
+        pending = b''
+        while True:
+            data = self.stream.read(self.read_size)
+            if not data:
+                break
+            block = pending + data
+            cut = block.rfind(b'\n') + 1
+            pending = block[cut:]
+            if cut:
+                yield block[:cut]
+        if pending.strip():
+            yield pending + b'\n'
+
+    def parse(self, block:bytes) -> pd.DataFrame:
+        """Parses a block of complete lines into a single DataFrame."""
+        batches = list(self.parse_batches(block))
+        if len(batches) == 1:
+            return batches[0]
+        if not batches:
+            return pd.DataFrame(columns=self.columns, dtype=object)
+        return pd.concat(batches, ignore_index=True)
+
+    def parse_batches(self, block:bytes) -> Iterator[pd.DataFrame]:
+        """Parses a block of complete lines into DataFrames of at most `rows_per_batch` rows."""
+        if not block.endswith(b'\n'):
+            block+=b'\n'
+        data = np.frombuffer(block, dtype=np.uint8)
+
+        ends = np.flatnonzero(data == NEWLINE)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        has_carriage_return = (ends > starts) & (data[np.maximum(ends - 1, 0)] == CARRIAGE_RETURN)
+        ends = ends - has_carriage_return
+        non_blank = ends > starts
+        starts, ends = starts[non_blank], ends[non_blank]
+
+        for first in range(0, len(starts), self.rows_per_batch):
+            last = first + self.rows_per_batch
+            yield self._parse_lines(data, starts[first:last], ends[first:last])
+
+    def _parse_lines(self, data:np.ndarray, starts:np.ndarray, ends:np.ndarray) -> pd.DataFrame:
+        columns_count = len(self.columns)
+        lines_count = len(starts)
+        offset = starts[0]
+        span = data[offset:ends[-1]]
+
+        # Locate every `";"` separator and every quote, and the line each one belongs to.
+        separators = np.flatnonzero((span[:-2] == QUOTE) & (span[1:-1] == SEPARATOR) & (span[2:] == QUOTE)) + offset
+        separator_lines = np.searchsorted(starts, separators, side='right') - 1
+        quotes = np.flatnonzero(span == QUOTE) + offset
+        quote_lines = np.searchsorted(starts, quotes, side='right') - 1
+
+        regular = (
+            (np.bincount(separator_lines, minlength=lines_count) == columns_count - 1)
+            & (np.bincount(quote_lines, minlength=lines_count) == 2 * columns_count)
+            & (data[starts] == QUOTE)
+            & (data[ends - 1] == QUOTE)
+        )
+        regular_positions = np.flatnonzero(regular)
+        regular_count = len(regular_positions)
+
+        field_separators = separators[regular[separator_lines]].reshape(regular_count, columns_count - 1)
+        field_starts = np.column_stack([starts[regular] + 1, field_separators + 3])
+        field_ends = np.column_stack([field_separators, ends[regular] - 1])
+
+        frame = pd.DataFrame({
+            column: self._gather(data, field_starts[:, i], field_ends[:, i] - field_starts[:, i], self._buffers[i])
+            for i, column in enumerate(self.columns)
+        })
+        frame.index = regular_positions
+
+        irregular_positions = np.flatnonzero(~regular)
+        if len(irregular_positions):
+            fallback = self._parse_with_csv(data, starts[irregular_positions], ends[irregular_positions])
+            fallback.index = irregular_positions
+            frame = pd.concat([frame, fallback]).sort_index()
+
+        return frame.reset_index(drop=True)
+
+    def _gather(self, data:np.ndarray, starts:np.ndarray, lengths:np.ndarray, buffer:np.ndarray) -> pd.Series:
+        """Copies each field's bytes into the reusable fixed-width buffer and decodes the filled part."""
+        rows = len(starts)
+        width = buffer.dtype.itemsize
+        matrix = buffer.view(np.uint8).reshape(len(buffer), width)
+
+        lengths = np.minimum(lengths, width)
+        span = int(lengths.max()) if rows else 0
+        offsets = np.arange(span)
+        indexes = np.minimum(starts[:, None] + offsets, len(data) - 1)
+        matrix[:rows, :span] = np.where(offsets < lengths[:, None], data[indexes], 0)
+        matrix[:rows, span:] = 0
+
+        if self.encoding == 'latin-1':
+            # Latin-1 bytes are the Unicode code points themselves, so widening them to UCS-4
+            # decodes the whole column at once.
+            decoded = np.ascontiguousarray(matrix[:rows, :max(span, 1)], dtype=np.uint32).view(f'U{max(span, 1)}').ravel()
+            return pd.Series(decoded.astype(object))
+        return pd.Series(buffer[:rows]).str.decode(self.encoding)
+
+    def _parse_with_csv(self, data:np.ndarray, starts:np.ndarray, ends:np.ndarray) -> pd.DataFrame:
+        columns_count = len(self.columns)
+        lines = [data[start:end].tobytes().decode(self.encoding) for start, end in zip(starts, ends)]
+        rows = []
+        for fields in csv.reader(lines, delimiter=';'):
+            rows.append((fields + [''] * columns_count)[:columns_count])
+        return pd.DataFrame(rows, columns=self.columns, dtype=object)
@@ -0,0 +1,79 @@
+import logging
+import zipfile
+from typing import Dict, Optional, Set, Tuple
+import pandas as pd
+
+from .models import Municipality
+from .readers import find_csv_member
+from .transforms import normalize_names
+
+logger = logging.getLogger(__name__)
+
+MUNICIPALITIES_CSV_MARKER = 'MUNICCSV'
+# IBGE codes of the federative units, which are also the State ids.
+UF_CODES = {
+    'RO': 11, 'AC': 12, 'AM': 13, 'RR': 14, 'PA': 15, 'AP': 16, 'TO': 17,
+    'MA': 21, 'PI': 22, 'CE': 23, 'RN': 24, 'PB': 25, 'PE': 26, 'AL': 27, 'SE': 28, 'BA': 29,
+    'MG': 31, 'ES': 32, 'RJ': 33, 'SP': 35,
+    'PR': 41, 'SC': 42, 'RS': 43,
+    'MS': 50, 'MT': 51, 'GO': 52, 'DF': 53,
+}
+# Establishments abroad use UF 'EX' and have no IBGE municipality.
+FOREIGN_UF = 'EX'
+
+
+class MunicipalityResolver:
+    """
+    Maps the Receita municipality codes (SIAFI/TOM, not IBGE) to Municipality ids in memory.
+
+    The Receita Municipios table only gives each code's name, so codes are matched to the
+    IBGE municipalities by UF and accent-insensitive name. Both tables are loaded once;
+    each chunk then resolves its few distinct (UF, code) pairs and maps the rows with
+    a dictionary lookup, without any query per row.
+    """
+
+    def __init__(self, receita_names:Dict[str, str], ibge_ids:Dict[Tuple[int, str], int]):
+        self.receita_names = receita_names
+        self.ibge_ids = ibge_ids
+        self.resolved: Dict[str, Optional[int]] = {}
+        self.unresolved: Set[Tuple[str, str, str]] = set()
+
+    @classmethod
+    def from_archive(cls, municipios_zip_path:str) -> 'MunicipalityResolver':
+        """Reads the Receita Municipios ZIP and the IBGE municipalities stored by populate_ibge."""
+        with zipfile.ZipFile(municipios_zip_path, 'r') as zf:
+            with zf.open(find_csv_member(zf, MUNICIPALITIES_CSV_MARKER), 'r') as csv_file:
+                receita = pd.read_csv(
+                    csv_file, header=None, names=['codigo', 'nome'], sep=';', encoding='latin-1', dtype=str
+                )
+        receita_names = dict(zip(receita['codigo'].str.strip(), normalize_names(receita['nome'])))
+
+        ibge = pd.DataFrame(list(Municipality.objects.values_list('id', 'nome', 'estado_id')), columns=['id', 'nome', 'estado_id'])
+        ibge_ids = dict(zip(zip(ibge['estado_id'], normalize_names(ibge['nome'])), ibge['id']))
+
+        logger.info(f"Loaded {len(receita_names)} Receita municipality codes and {len(ibge_ids)} IBGE municipalities.")
+        return cls(receita_names, ibge_ids)
+
+    def _resolve_key(self, uf:str, code:str) -> Optional[int]:
+        name = self.receita_names.get(code)
+        municipality_id = self.ibge_ids.get((UF_CODES.get(uf), name))
+        if municipality_id is None and uf != FOREIGN_UF:
+            self.unresolved.add((uf, code, name))
+        return municipality_id
+
+    def resolve(self, ufs:pd.Series, codes:pd.Series) -> pd.Series:
+        """Returns the Municipality id of every (UF, code) pair, or <NA> when it has no IBGE match."""
+        keys = ufs.fillna('') + ':' + codes.fillna('')
+        for key in keys.drop_duplicates():
+            if key not in self.resolved:
+                uf, code = key.split(':', 1)
+                self.resolved[key] = self._resolve_key(uf, code)
+        return keys.map(self.resolved).astype('Int64')
+
+    def log_unresolved(self, limit:int=20):
+        if not self.unresolved:
+            return
+        sample = ', '.join(f"{uf}/{code} ({name or 'unknown code'})" for uf, code, name in sorted(self.unresolved, key=str)[:limit])
+        logger.warning(
+            f"{len(self.unresolved)} Receita municipality codes have no IBGE match and were left without municipality: {sample}"
+        )
@@ -0,0 +1,48 @@
+import contextlib
+import contextvars
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+_primary_only = contextvars.ContextVar('arko_primary_only', default=False)
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Sends every query made inside the block to the primary, so the imports read the rows they just wrote."""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+def replica_configured() -> bool:
+    return REPLICA in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads of the arko models go to the 'replica' database when one is configured, so the
+    list, filter and export pages do not compete with the imports for the primary. Writes,
+    reads inside use_primary() and the tables of the other apps (users, sessions) always use
+    the primary: a login must see the session it just created, whatever the replication lag.
+    Without a replica every query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'arko' and replica_configured() and not _primary_only.get():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A standby follows the primary's schema; `migrate --database replica` stays possible for a standalone copy.
+        return None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
 
 class RegionSchema(BaseModel):
@@ -51,3 +51,37 @@ class DistrictSchema(BaseModel):
     id: int
     nome: str = Field(alias='nome')
     municipio: MunicipalityRefSchema = Field(alias='municipio')
+
+
+# Lean projections of the municipality and district payloads: only the fields the
+# hierarchy sync reads. Pydantic ignores the other keys, so validating a whole response
+# with validate_json skips building the nested objects it would otherwise discard.
+
+class UFRefSchema(BaseModel):
+    id: int
+
+class MesorregiaoRefSchema(BaseModel):
+    UF: UFRefSchema
+
+class MicrorregiaoRefSchema(BaseModel):
+    mesorregiao: Optional[MesorregiaoRefSchema] = None
+
+class IntermediateRegionRef(BaseModel):
+    UF: UFRefSchema
+
+class ImmediateRegionRef(BaseModel):
+    regiaointermediaria: IntermediateRegionRef = Field(alias='regiao-intermediaria')
+
+class MunicipalityProjection(BaseModel):
+    id: int
+    nome: str
+    microrregiao: Optional[MicrorregiaoRefSchema] = None
+    regiao_imediata: Optional[ImmediateRegionRef] = Field(default=None, alias='regiao-imediata')
+
+class DistrictProjection(BaseModel):
+    id: int
+    nome: str
+    municipio: MunicipalityRefSchema
+
+MUNICIPALITIES_ADAPTER = TypeAdapter(List[MunicipalityProjection])
+DISTRICTS_ADAPTER = TypeAdapter(List[DistrictProjection])
@@ -0,0 +1,47 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Case, FloatField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast
+
+from .models import SEARCH_CONFIG
+from .transforms import normalize_name
+
+RELEVANCE_FIELD = 'relevancia'
+
+
+def word_prefix_query(normalized:str) -> SearchQuery:
+    """
+    Matches names containing every word of the term, the last one possibly still being typed:
+    'SAO JOSE DO R' -> 'SAO & JOSE & DO & R:*'. Only the last word is a prefix because GIN has to
+    read every entry of a prefix in full, while whole words let it skip through the common ones.
+    """
+    *words, last = normalized.split()
+    return SearchQuery(' & '.join([*words, f'{last}:*']), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_by_name(queryset:QuerySet, field:str, text:str) -> QuerySet:
+    """
+    Accent and case-insensitive search on a normalized name column (see `name_search_indexes`).
+
+    A row matches when its name starts with the normalized term, which the pattern-ops B-tree
+    answers with a single range scan, or contains every word of it (see `word_prefix_query`),
+    which the GIN full-text index answers. Matches are annotated with `relevancia`: 1 for prefix matches
+    plus the ts_rank of the words, cast to double precision so it round-trips through cursors.
+    """
+    normalized = normalize_name(text)
+    if not normalized:
+        return queryset
+
+    vector = SearchVector(field, config=SEARCH_CONFIG)
+    query = word_prefix_query(normalized)
+    prefix = Q(**{f'{field}__startswith': normalized})
+    relevance = Case(When(prefix, then=Value(1.0)), default=Value(0.0)) + SearchRank(vector, query)
+    return (
+        queryset
+        .alias(busca=vector)
+        .filter(prefix | Q(busca=query))
+        .annotate(**{RELEVANCE_FIELD: Cast(relevance, FloatField())})
+    )
+
+
+def is_search(queryset:QuerySet) -> bool:
+    return RELEVANCE_FIELD in queryset.query.annotations
@@ -1,62 +1,247 @@
+import gzip
+import hashlib
+import json
 import logging
+import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from typing import List, Dict, Any
-from pydantic import ValidationError
+from typing import Callable, List, Dict, Any, NamedTuple, Optional, Union
+from pydantic import TypeAdapter, ValidationError
+from urllib3.util.retry import Retry
 
-from .schema import StateSchema, MunicipalitySchema, DistrictSchema
+from .metrics import ImportMetrics
+from .schema import (
+    DISTRICTS_ADAPTER, MUNICIPALITIES_ADAPTER, DistrictProjection, DistrictSchema,
+    MunicipalityProjection, MunicipalitySchema, StateSchema,
+)
 
-IBGE_API_URL = "https://servicodados.ibge.gov.br/api/v1/localidades"
 DEFAULT_TIMEOUT = 15 ## seconds
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5 ## seconds, doubled on every retry
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60 ## seconds
 
 logger = logging.getLogger(__name__)
 
+class OfflineCacheMiss(RequestException):
+    """Raised in offline mode when a response was never cached."""
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+class ResponseCache:
+    """
+    On-disk cache of API responses: the gzip-compressed body (`<key>.json.gz`) and its
+    validators (`<key>.meta.json`), keyed by a hash of the URL. Files are written to a
+    temporary name and renamed, so concurrent shards and interrupted runs never leave a torn entry.
+    """
+
+    def __init__(self, directory:str, ttl:float=DEFAULT_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url:str, suffix:str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest()[:32] + suffix)
+
+    def get(self, url:str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(url, '.meta.json')) as meta_file:
+                meta = json.load(meta_file)
+            with gzip.open(self._path(url, '.json.gz'), 'rb') as body_file:
+                body = body_file.read()
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(body, meta.get('etag'), meta.get('last_modified'), meta['fetched_at'])
+
+    def is_fresh(self, entry:CachedResponse) -> bool:
+        return time.time() - entry.fetched_at < self.ttl
+
+    def _write(self, path:str, data:bytes, compress:bool=False):
+        temporary_path = f"{path}.tmp-{os.getpid()}-{id(data)}"
+        with (gzip.open(temporary_path, 'wb') if compress else open(temporary_path, 'wb')) as output:
+            output.write(data)
+        os.replace(temporary_path, path)
+
+    def store(self, url:str, body:bytes, etag:Optional[str]=None, last_modified:Optional[str]=None) -> CachedResponse:
+        entry = CachedResponse(body, etag, last_modified, time.time())
+        self._write(self._path(url, '.json.gz'), body, compress=True)
+        self._write_meta(url, entry)
+        return entry
+
+    def touch(self, url:str, entry:CachedResponse) -> CachedResponse:
+        """Restarts the TTL of an entry the server confirmed with a 304."""
+        entry = entry._replace(fetched_at=time.time())
+        self._write_meta(url, entry)
+        return entry
+
+    def _write_meta(self, url:str, entry:CachedResponse):
+        meta = {'url': url, 'etag': entry.etag, 'last_modified': entry.last_modified, 'fetched_at': entry.fetched_at}
+        self._write(self._path(url, '.meta.json'), json.dumps(meta).encode())
+
 class IBGEApiClient:
     """"
     A client to interact with the IBGE Locality API.
+    Failed requests (connection errors, timeouts, 429 and 5xx) are retried with exponential backoff.
+    With `concurrency` above 1, municipalities and districts are fetched per UF
+    (`estados/{id}/municipios`), with at most `concurrency` requests in flight, and merged.
+    With a `cache`, responses younger than its TTL are served from disk and older ones are
+    revalidated with If-None-Match/If-Modified-Since; `offline` only replays cached responses.
+    Municipalities and districts are validated straight from the response bytes into lean
+    projections holding only what the sync reads, unless `full_validation` asks for the full schemas.
     """
 
-    def __init__(self):
+    def __init__(self, metrics:Optional[ImportMetrics]=None, base_url:Optional[str]=None,
+                 concurrency:int=1, max_retries:int=MAX_RETRIES,
+                 cache:Optional[ResponseCache]=None, offline:bool=False, full_validation:bool=False):
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a response cache.")
+        self.base_url = (base_url or settings.IBGE_API_URL).rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.offline = offline
+        self.full_validation = full_validation
         self.session = requests.Session()
         self.session.headers.update({'Accept': 'application/json'})
 
-    def _make_request(self, endpoint:str)-> List[Dict[str, Any]]:
-        """Makes a request to a given endpoint."""
-        url= f"{IBGE_API_URL}/{endpoint}"
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.metrics = metrics or ImportMetrics('ibge_api')
+
+    def _get_body(self, endpoint:str) -> bytes:
+        """Fetches the raw response body of an endpoint."""
+        url= f"{self.base_url}/{endpoint}"
         try:
-            response=self.session.get(url, timeout=DEFAULT_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
+            return self._fetch_body(url)
         except RequestException as e:
             logger.error(f"Error during API request to {url}: {e}", exc_info=True)
             raise
+
+    def _decode(self, body:bytes) -> List[Dict[str, Any]]:
+        try:
+            with self.metrics.stage('json_decode'):
+                return json.loads(body)
         except ValueError as e:
-            logger.error(f"Error decoding JSON from {url}: {e}", exc_info=True)
+            logger.error(f"Error decoding JSON response: {e}", exc_info=True)
             raise
 
+    def _make_request(self, endpoint:str)-> List[Dict[str, Any]]:
+        """Makes a request to a given endpoint."""
+        return self._decode(self._get_body(endpoint))
+
+    def _lean_parser(self, adapter:TypeAdapter, label:str) -> Callable[[bytes], list]:
+        """Validates a whole response in one call, parsing the JSON bytes without an intermediate dict tree."""
+        def parse(body:bytes) -> list:
+            try:
+                with self.metrics.stage('validation'):
+                    return adapter.validate_json(body)
+            except ValidationError as e:
+                logger.error(f"API response for {label} did not match schema: {e}")
+                raise
+        return parse
+
+    def _fetch_body(self, url:str) -> bytes:
+        """Returns the response body, from the cache when it is fresh, still valid or when offline."""
+        entry = None
+        if self.cache is not None:
+            with self.metrics.stage('cache_read'):
+                entry = self.cache.get(url)
+            if self.offline:
+                if entry is None:
+                    raise OfflineCacheMiss(f"{url} is not cached and offline mode is on.")
+                return entry.body
+            if entry is not None and self.cache.is_fresh(entry):
+                return entry.body
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        with self.metrics.stage('http_fetch'):
+            response=self.session.get(url, timeout=DEFAULT_TIMEOUT, headers=headers)
+            if entry is not None and response.status_code == 304:
+                self.cache.touch(url, entry)
+                logger.debug(f"{url} not modified, using the cached response.")
+                return entry.body
+            response.raise_for_status()
+            body = response.content
+
+        if self.cache is not None:
+            with self.metrics.stage('cache_write'):
+                self.cache.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return body
+
+    def _fetch_level(self, resource:str, states:Optional[List[StateSchema]]=None,
+                     parse:Optional[Callable[[bytes], list]]=None) -> list:
+        """
+        Fetches a whole level, sharded per UF when running concurrently and the states are known.
+        Every response is turned into a list by `parse`, which defaults to decoding the JSON.
+        """
+        parse = parse or self._decode
+        full_level = f"{resource}?orderBy=nome"
+        if self.offline and states:
+            # Replay whichever form an earlier run cached, serial or sharded.
+            sharded = self.cache.get(f"{self.base_url}/{full_level}") is None
+        else:
+            sharded = self.concurrency > 1 and bool(states)
+        if not sharded:
+            return parse(self._get_body(full_level))
+
+        endpoints = [f"estados/{state.id}/{resource}?orderBy=nome" for state in states]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            shards = list(pool.map(lambda endpoint: parse(self._get_body(endpoint)), endpoints))
+        logger.info(f"Fetched {resource} in {len(shards)} shards with {self.concurrency} concurrent requests.")
+        return [item for shard in shards for item in shard]
+
     def get_states(self) -> List[StateSchema]:
         """Fetches and validates all states from the API."""
         response_data = self._make_request("estados?orderBy=nome")
 
         try:
-            return [StateSchema.model_validate(item) for item in response_data]
+            with self.metrics.stage('validation'):
+                return [StateSchema.model_validate(item) for item in response_data]
         except ValidationError as e:
             logger.error(f"API response for States did not match schema: {e}") 
             raise
-    def get_all_municipalities(self) -> List[MunicipalitySchema]:
+    def get_all_municipalities(self, states:Optional[List[StateSchema]]=None
+                               ) -> List[Union[MunicipalityProjection, MunicipalitySchema]]:
         """Fetches and validates all municipalities."""
-        response_data = self._make_request("municipios?orderBy=nome")
+        if not self.full_validation:
+            return self._fetch_level("municipios", states, self._lean_parser(MUNICIPALITIES_ADAPTER, 'Municipalities'))
+        response_data = self._fetch_level("municipios", states)
         
         try:
-            return [MunicipalitySchema.model_validate(item) for item in response_data]
+            with self.metrics.stage('validation'):
+                return [MunicipalitySchema.model_validate(item) for item in response_data]
         except ValidationError as e:
             logger.error(f"API response for Municipalities did not match schema: {e}")
             raise
-    def get_all_districts(self) -> List[DistrictSchema]:
+    def get_all_districts(self, states:Optional[List[StateSchema]]=None) -> List[Union[DistrictProjection, DistrictSchema]]:
         """Fetches and validates all districts."""
-        response_data = self._make_request("distritos?orderBy=nome")
+        if not self.full_validation:
+            return self._fetch_level("distritos", states, self._lean_parser(DISTRICTS_ADAPTER, 'Districts'))
+        response_data = self._fetch_level("distritos", states)
         try:
-            return [DistrictSchema.model_validate(item) for item in response_data]
+            with self.metrics.stage('validation'):
+                return [DistrictSchema.model_validate(item) for item in response_data]
         except ValidationError as e:
             logger.error(f"API reponse for Districts did not match schema: {e}")
             raise
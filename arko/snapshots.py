@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import shutil
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from .readers import find_csv_member
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+META_FILE = 'meta.json'
+ENCODING = 'latin-1'
+# Every BLOCK_ROWS rows, the byte offset of each column is stored, so any row range
+# can be located by summing at most BLOCK_ROWS lengths.
+BLOCK_ROWS = 65536
+MAX_FIELD_LENGTH = np.iinfo(np.uint16).max
+# Columns up to this width are decoded as a fixed-width matrix; wider ones by slicing one decoded string.
+VECTORIZED_DECODE_WIDTH = 64
+
+
+def snapshot_key(archive:str, member:zipfile.ZipInfo) -> str:
+    """
+    Names a snapshot after the archive and the CRC-32 and size of its CSV member, which the ZIP
+    already stores, so a new monthly file never reuses an old snapshot and no extra hashing pass is needed.
+    """
+    archive_name = os.path.splitext(os.path.basename(archive))[0]
+    return f"{archive_name}-{member.CRC:08x}-{member.file_size}"
+
+
+class ColumnarSnapshot:
+    """
+    Read side of a snapshot: every column of a parsed Receita CSV stored as its latin-1 bytes
+    back to back (`<column>.data`), the uint16 length of each field (`<column>.lengths`) and the
+    byte offset of every block of rows (`<column>.blocks.npy`), all memory-mapped.
+
+    Nothing is read until a row range is requested, and only that range is decoded, so a
+    snapshot can be reloaded or analysed in batches much faster than parsing the CSV again:
+
+        snapshot = ColumnarSnapshot('/arko/data/snapshots/Empresas0-1a2b3c4d-1234567')
+        frame = snapshot.to_frame(['cnpj', 'capital_social'])
+
+    Empty fields are read back as '' (not NaN), which the transforms treat the same way.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as meta_file:
+            self.meta = json.load(meta_file)
+        self.columns: List[str] = self.meta['columns']
+        self.rows: int = self.meta['rows']
+        self._data = {column: self._map(column, 'data', np.uint8) for column in self.columns}
+        self._lengths = {column: self._map(column, 'lengths', np.uint16) for column in self.columns}
+        self._blocks = {
+            column: np.load(os.path.join(path, f'{column}.blocks.npy'), mmap_mode='r') for column in self.columns
+        }
+
+    def _map(self, column:str, suffix:str, dtype) -> np.ndarray:
+        file_path = os.path.join(self.path, f'{column}.{suffix}')
+        if os.path.getsize(file_path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r')
+
+    @classmethod
+    def for_member(cls, snapshot_dir:str, archive:str, member:zipfile.ZipInfo,
+                   columns:List[str]) -> Optional['ColumnarSnapshot']:
+        """Returns the finished snapshot of the archive's CSV member, if one exists with the same columns."""
+        path = os.path.join(snapshot_dir, snapshot_key(archive, member))
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            return None
+        snapshot = cls(path)
+        if snapshot.meta.get('format') != SNAPSHOT_FORMAT or snapshot.columns != columns:
+            logger.warning(f"Ignoring snapshot {path}: it was written with a different layout.")
+            return None
+        return snapshot
+
+    @classmethod
+    def for_archive(cls, snapshot_dir:str, archive:str, marker:str, columns:List[str]) -> Optional['ColumnarSnapshot']:
+        with zipfile.ZipFile(archive, 'r') as zf:
+            return cls.for_member(snapshot_dir, archive, zf.getinfo(find_csv_member(zf, marker)), columns)
+
+    def column_bytes(self, column:str) -> Tuple[np.ndarray, np.ndarray]:
+        """The memory-mapped latin-1 bytes and field lengths of a column, without decoding anything."""
+        return self._data[column], self._lengths[column]
+
+    def values(self, column:str, start:int=0, stop:Optional[int]=None) -> pd.Series:
+        stop = self.rows if stop is None else min(stop, self.rows)
+        lengths = np.asarray(self._lengths[column][start:stop], dtype=np.int64)
+        if not len(lengths):
+            return pd.Series([], dtype=object)
+
+        block = start // BLOCK_ROWS
+        first = int(self._blocks[column][block]) + int(self._lengths[column][block * BLOCK_ROWS:start].sum(dtype=np.int64))
+        ends = np.cumsum(lengths)
+        data = self._data[column][first:first + int(ends[-1])]
+        starts = ends - lengths
+
+        width = int(lengths.max())
+        if width <= VECTORIZED_DECODE_WIDTH:
+            # Latin-1 bytes are the Unicode code points, so widening them to UCS-4 decodes the whole column at once.
+            positions = np.arange(max(width, 1))
+            indexes = np.minimum(starts[:, None] + positions, max(len(data) - 1, 0))
+            matrix = np.where(positions < lengths[:, None], data[indexes] if len(data) else 0, 0).astype(np.uint32)
+            return pd.Series(np.ascontiguousarray(matrix).view(f'U{max(width, 1)}').ravel().astype(object))
+
+        # Latin-1 maps one byte to one character, so byte positions are string positions.
+        text = data.tobytes().decode(ENCODING)
+        return pd.Series([text[a:b] for a, b in zip(starts.tolist(), ends.tolist())], dtype=object)
+
+    def to_frame(self, columns:Optional[List[str]]=None, start:int=0, stop:Optional[int]=None) -> pd.DataFrame:
+        columns = columns or self.columns
+        frame = pd.DataFrame({column: self.values(column, start, stop) for column in columns})
+        frame.index = pd.RangeIndex(len(frame))
+        return frame
+
+    def iter_chunks(self, chunk_size:int, columns:Optional[List[str]]=None) -> Iterator[pd.DataFrame]:
+        for start in range(0, self.rows, chunk_size):
+            yield self.to_frame(columns, start, start + chunk_size)
+
+
+class SnapshotWriter:
+    """
+    Appends parsed chunks to a new snapshot. Files are written to a temporary directory that is
+    renamed into place only when the whole CSV was read, so a failed import never leaves a
+    partial snapshot behind.
+    """
+
+    def __init__(self, snapshot_dir:str, archive:str, member:zipfile.ZipInfo, columns:List[str]):
+        self.path = os.path.join(snapshot_dir, snapshot_key(archive, member))
+        self.temporary_path = f"{self.path}.tmp-{os.getpid()}"
+        self.columns = columns
+        self.source = {
+            'archive': os.path.basename(archive),
+            'csv_member': member.filename,
+            'member_crc': member.CRC,
+            'member_size': member.file_size,
+        }
+        self.rows = 0
+        self._files = {}
+        self._sizes: Dict[str, int] = {column: 0 for column in columns}
+        self._blocks: Dict[str, List[int]] = {column: [] for column in columns}
+
+    def __enter__(self):
+        os.makedirs(self.temporary_path, exist_ok=True)
+        for column in self.columns:
+            self._files[column] = (
+                open(os.path.join(self.temporary_path, f'{column}.data'), 'wb'),
+                open(os.path.join(self.temporary_path, f'{column}.lengths'), 'wb'),
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for data_file, lengths_file in self._files.values():
+            data_file.close()
+            lengths_file.close()
+        if exc_type is not None:
+            shutil.rmtree(self.temporary_path, ignore_errors=True)
+            return
+        self._finish()
+
+    def append(self, chunk:pd.DataFrame):
+        rows = len(chunk)
+        block_starts = np.arange(-(-self.rows // BLOCK_ROWS) * BLOCK_ROWS, self.rows + rows, BLOCK_ROWS) - self.rows
+
+        for column in self.columns:
+            values = chunk[column].fillna('').astype(str)
+            lengths = values.str.len().to_numpy()
+            if rows and lengths.max() > MAX_FIELD_LENGTH:
+                values = values.str.slice(0, MAX_FIELD_LENGTH)
+                lengths = np.minimum(lengths, MAX_FIELD_LENGTH)
+
+            offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+            self._blocks[column].extend((self._sizes[column] + offsets[block_starts]).tolist())
+
+            data = ''.join(values.tolist()).encode(ENCODING)
+            data_file, lengths_file = self._files[column]
+            data_file.write(data)
+            lengths_file.write(lengths.astype(np.uint16).tobytes())
+            self._sizes[column]+=len(data)
+
+        self.rows+=rows
+
+    def _finish(self):
+        for column in self.columns:
+            np.save(os.path.join(self.temporary_path, f'{column}.blocks.npy'), np.array(self._blocks[column] or [0], dtype=np.int64))
+        meta = {
+            'format': SNAPSHOT_FORMAT,
+            'columns': self.columns,
+            'rows': self.rows,
+            'encoding': ENCODING,
+            'source': self.source,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+        with open(os.path.join(self.temporary_path, META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.temporary_path, self.path)
+        logger.info(f"Wrote columnar snapshot of {self.rows} rows to {self.path}.")
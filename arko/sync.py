@@ -0,0 +1,150 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from django.db import models
+
+from .metrics import ImportMetrics
+from .models import District, Municipality, Region, State
+from .schema import DistrictSchema, MunicipalitySchema, StateSchema
+from .transforms import normalize_name
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Fields compared and written for each level, in the order of the payload tuples.
+REGION_FIELDS = ['sigla', 'nome']
+STATE_FIELDS = ['sigla', 'nome', 'regiao_id']
+# Municipalities and districts also carry their ancestors, so a state moving to another
+# region, or a municipality to another state, updates every row below it.
+MUNICIPALITY_FIELDS = ['nome', 'nome_normalizado', 'estado_id', 'regiao_id']
+DISTRICT_FIELDS = ['nome', 'nome_normalizado', 'municipio_id', 'estado_id', 'regiao_id']
+
+
+class SyncResult(NamedTuple):
+    level: str
+    created: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+    def __str__(self):
+        return f"{self.level}: {self.created} created, {self.updated} updated, {self.deleted} deleted, {self.unchanged} unchanged"
+
+
+class LevelDiff(NamedTuple):
+    to_create: List[int]
+    to_update: List[int]
+    to_delete: List[int]
+    unchanged: int
+
+
+def diff_level(model:models.Model, payload:Dict[int, Tuple], fields:List[str]) -> LevelDiff:
+    """Compares the payload, keyed by id, with the stored rows in one query."""
+    stored = {row[0]: row[1:] for row in model.objects.order_by().values_list('id', *fields)}
+    to_create = [pk for pk in payload if pk not in stored]
+    to_update = [pk for pk, values in payload.items() if pk in stored and stored[pk] != values]
+    to_delete = [pk for pk in stored if pk not in payload]
+    return LevelDiff(to_create, to_update, to_delete, len(payload) - len(to_create) - len(to_update))
+
+
+class IBGEHierarchySync:
+    """
+    Synchronizes Region, State, Municipality and District with an IBGE payload.
+
+    Every level is diffed in memory against its stored rows, then written with bulk_create
+    and bulk_update from the top of the hierarchy down, so parents always exist first.
+    Rows missing from the payload are deleted afterwards from the bottom up, so no PROTECT
+    foreign key is ever violated. A level whose payload came back empty is never deleted from.
+    Municipalities and districts store the ids of all their ancestors, compared and written like any other field.
+    """
+
+    def __init__(self, metrics:Optional[ImportMetrics]=None, delete:bool=True):
+        self.metrics = metrics or ImportMetrics('ibge_sync')
+        self.delete = delete
+
+    def sync(self, states:List[StateSchema], municipalities:List[MunicipalitySchema],
+             districts:List[DistrictSchema]) -> List[SyncResult]:
+        levels = [
+            (Region, REGION_FIELDS, self.region_payload(states)),
+            (State, STATE_FIELDS, self.state_payload(states)),
+        ]
+        municipality_payload = self.municipality_payload(municipalities, levels[1][2])
+        levels.append((Municipality, MUNICIPALITY_FIELDS, municipality_payload))
+        levels.append((District, DISTRICT_FIELDS, self.district_payload(districts, municipality_payload)))
+
+        diffs = []
+        for model, fields, payload in levels:
+            with self.metrics.stage('diff'):
+                diff = diff_level(model, payload, fields)
+            with self.metrics.stage('db_write'):
+                self.apply_changes(model, fields, payload, diff)
+            diffs.append(diff)
+
+        results = []
+        for (model, fields, payload), diff in reversed(list(zip(levels, diffs))):
+            deleted = 0
+            if self.delete and payload and diff.to_delete:
+                with self.metrics.stage('db_write'):
+                    model.objects.filter(id__in=diff.to_delete).delete()
+                deleted = len(diff.to_delete)
+            elif diff.to_delete:
+                logger.warning(f"Keeping {len(diff.to_delete)} {model.__name__} rows that are missing from the IBGE payload.")
+            results.append(SyncResult(model.__name__, len(diff.to_create), len(diff.to_update), deleted, diff.unchanged))
+
+        results.reverse()
+        for result in results:
+            logger.info(f"Sync {result}")
+        return results
+
+    def apply_changes(self, model:models.Model, fields:List[str], payload:Dict[int, Tuple], diff:LevelDiff):
+        def build(pk):
+            return model(id=pk, **dict(zip(fields, payload[pk])))
+
+        if diff.to_create:
+            model.objects.bulk_create([build(pk) for pk in diff.to_create], batch_size=BATCH_SIZE)
+        if diff.to_update:
+            update_fields = [field[:-3] if field.endswith('_id') else field for field in fields]
+            model.objects.bulk_update([build(pk) for pk in diff.to_update], update_fields, batch_size=BATCH_SIZE)
+
+    @staticmethod
+    def region_payload(states:List[StateSchema]) -> Dict[int, Tuple]:
+        return {state.regiao.id: (state.regiao.sigla, state.regiao.nome) for state in states}
+
+    @staticmethod
+    def state_payload(states:List[StateSchema]) -> Dict[int, Tuple]:
+        return {state.id: (state.sigla, state.nome, state.regiao.id) for state in states}
+
+    @staticmethod
+    def municipality_payload(municipalities:List[MunicipalitySchema], states:Dict[int, Tuple]) -> Dict[int, Tuple]:
+        """
+        Takes the state from the microrregiao, or from the regiao-imediata for the municipalities
+        IBGE no longer assigns to a microrregiao.
+        """
+        payload = {}
+        skipped = 0
+        for data in municipalities:
+            if data.microrregiao and data.microrregiao.mesorregiao:
+                state_id = data.microrregiao.mesorregiao.UF.id
+            elif data.regiao_imediata:
+                state_id = data.regiao_imediata.regiaointermediaria.UF.id
+            else:
+                state_id = None
+
+            if state_id not in states:
+                skipped+=1
+                continue
+            payload[data.id] = (data.nome, normalize_name(data.nome), state_id, states[state_id][2])
+
+        if skipped:
+            logger.warning(f"{skipped} municipalities have no known state in the IBGE payload. Skipping.")
+        return payload
+
+    @staticmethod
+    def district_payload(districts:List[DistrictSchema], municipalities:Dict[int, Tuple]) -> Dict[int, Tuple]:
+        payload = {
+            data.id: (data.nome, normalize_name(data.nome), data.municipio.id, *municipalities[data.municipio.id][2:])
+            for data in districts if data.municipio.id in municipalities
+        }
+        if len(payload) < len(districts):
+            logger.warning(f"{len(districts) - len(payload)} districts belong to unknown municipalities. Skipping.")
+        return payload
@@ -1,3 +1,135 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connections, router
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from requests.exceptions import HTTPError
 
-# Create your tests here.
+from .benchmarks import IBGEFixtures, IBGEStubServer
+from .models import Company, DataVersion, State
+from .routers import PRIMARY, REPLICA, replica_configured, use_primary
+from .services import IBGEApiClient
+
+# Keeps the retries of the tests fast: the second retry of a request waits 2 * this.
+TEST_BACKOFF_FACTOR = 0.05
+
+
+def dump(items) -> list:
+    return [item.model_dump() for item in sorted(items, key=lambda item: item.id)]
+
+
+@mock.patch('arko.services.BACKOFF_FACTOR', TEST_BACKOFF_FACTOR)
+class IBGEApiClientTests(SimpleTestCase):
+    """IBGEApiClient against the local IBGE stub: sharding per UF, merging and retries."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fixtures = IBGEFixtures()
+
+    def fetch(self, stub:IBGEStubServer, **kwargs) -> dict:
+        client = IBGEApiClient(base_url=stub.url, **kwargs)
+        states = client.get_states()
+        return {
+            'states': dump(states),
+            'municipalities': dump(client.get_all_municipalities(states)),
+            'districts': dump(client.get_all_districts(states)),
+        }
+
+    def test_sharded_payload_matches_unsharded(self):
+        with IBGEStubServer(self.fixtures) as stub:
+            unsharded = self.fetch(stub)
+            sharded = self.fetch(stub, concurrency=8)
+
+        self.assertEqual(sharded, unsharded)
+        self.assertEqual({level: len(items) for level, items in sharded.items()}, self.fixtures.counts)
+        for state_id in (11, 35, 53):
+            self.assertEqual(len(stub.requests[f'estados/{state_id}/municipios']), 1)
+            self.assertEqual(len(stub.requests[f'estados/{state_id}/distritos']), 1)
+
+    def test_failed_requests_are_retried_with_backoff(self):
+        with IBGEStubServer(self.fixtures) as stub:
+            expected = self.fetch(stub)
+        with IBGEStubServer(self.fixtures, failures=2) as stub:
+            payload = self.fetch(stub, concurrency=8, max_retries=3)
+
+        self.assertEqual(payload, expected)
+        # 27 shards per level, plus the states.
+        self.assertEqual(len(stub.requests), 1 + 2 * 27)
+        for endpoint, calls in stub.requests.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(len(calls), 3)
+                # urllib3 retries the first failure at once and backs off from the second.
+                self.assertGreaterEqual(calls[2] - calls[1], 2 * TEST_BACKOFF_FACTOR)
+
+    def test_gives_up_after_max_retries(self):
+        with IBGEStubServer(self.fixtures, failures=3) as stub:
+            client = IBGEApiClient(base_url=stub.url, max_retries=2)
+            with self.assertRaises(HTTPError), self.assertLogs('arko.services', 'ERROR'):
+                client.get_states()
+
+        self.assertEqual(len(stub.requests['estados']), 3)
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Routing decisions, with and without a 'replica' alias (replica_configured is patched)."""
+
+    def patch_replica(self, configured:bool):
+        patcher = mock.patch('arko.routers.replica_configured', return_value=configured)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_arko_reads_use_the_replica(self):
+        self.patch_replica(True)
+        for model in (Company, State, DataVersion):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(router.db_for_read(model), REPLICA)
+                self.assertEqual(model.objects.all().db, REPLICA)
+
+    def test_use_primary_forces_the_primary(self):
+        self.patch_replica(True)
+        with use_primary():
+            self.assertEqual(router.db_for_read(Company), PRIMARY)
+            self.assertEqual(Company.objects.all().db, PRIMARY)
+        self.assertEqual(router.db_for_read(Company), REPLICA)
+
+    def test_writes_use_the_primary(self):
+        self.patch_replica(True)
+        for model in (Company, State, User, Session):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(router.db_for_write(model), PRIMARY)
+
+    def test_auth_and_session_reads_use_the_primary(self):
+        self.patch_replica(True)
+        self.assertEqual(User.objects.all().db, PRIMARY)
+        self.assertEqual(Session.objects.all().db, PRIMARY)
+
+    def test_everything_uses_the_primary_without_a_replica(self):
+        self.patch_replica(False)
+        for model in (Company, State, User, Session):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(router.db_for_read(model), PRIMARY)
+                self.assertEqual(router.db_for_write(model), PRIMARY)
+
+
+@skipUnless(replica_configured(), "Needs a 'replica' database (DB_REPLICA_HOST), which the tests mirror to the default one.")
+class ReplicaQueryTests(TestCase):
+    """The queries actually run on the connection the router picked."""
+    databases = {PRIMARY, REPLICA} if replica_configured() else {PRIMARY}
+
+    def test_reads_run_on_the_replica_and_writes_on_the_primary(self):
+        with CaptureQueriesContext(connections[PRIMARY]) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            list(Company.objects.all()[:1])
+            Company.objects.create(
+                cnpj='00000001', razao_social='EMPRESA TESTE', natureza_juridica='2062', qualificacao_responsavel='49', capital_social=1000
+            )
+            User.objects.filter(username='teste').exists()
+        self.assertEqual(len(replica), 1)
+        self.assertIn('arko_company', replica[0]['sql'])
+        self.assertEqual(len(primary), 2)
+
+    def test_use_primary_reads_run_on_the_primary(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica, use_primary():
+            Company.objects.filter(cnpj='00000001').exists()
+        self.assertEqual(len(replica), 0)
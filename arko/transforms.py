@@ -0,0 +1,207 @@
+import logging
+import re
+import unicodedata
+from typing import Callable, List, NamedTuple
+import numpy as np
+import pandas as pd
+
+from .models import Company, Establishment
+
+logger = logging.getLogger(__name__)
+
+STRING_COLUMNS = [
+    'cnpj', 'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'porte_empresa', 'ente_federativo_responsavel'
+]
+CAPITAL_COLUMN = 'capital_social'
+FINGERPRINT_COLUMN = 'content_fingerprint'
+SEARCH_NAME_COLUMN = 'razao_social_normalizada'
+NON_ALPHANUMERIC = r'[^A-Z0-9]+'
+REASON_COLUMN = 'reason'
+FINGERPRINT_SOURCE_COLUMNS = [
+    'razao_social', 'natureza_juridica', 'qualificacao_responsavel',
+    'capital_social', 'porte_empresa', 'ente_federativo_responsavel'
+]
+
+CAPITAL_PATTERN = r'^(-?)(\d+)(?:\.(\d*))?$'
+CNPJ_PATTERN = r'\d{8}'
+FULL_CNPJ_PATTERN = r'\d{14}'
+
+ESTABLISHMENT_STRING_COLUMNS = [
+    'cnpj_basico', 'cnpj_ordem', 'cnpj_dv', 'identificador_matriz_filial', 'nome_fantasia',
+    'situacao_cadastral', 'motivo_situacao_cadastral', 'cnae_fiscal_principal', 'tipo_logradouro',
+    'logradouro', 'numero', 'complemento', 'bairro', 'cep', 'uf', 'codigo_municipio'
+]
+ESTABLISHMENT_DATE_COLUMNS = ['data_situacao_cadastral', 'data_inicio_atividade']
+# Receita writes missing dates as '0' or '00000000'.
+MISSING_DATES = ['0', '00000000']
+
+
+class TransformedBatch(NamedTuple):
+    """
+    Output of the transform stage.
+    `valid` holds the rows ready for the loaders, named after the model's database columns;
+    `rejected` holds the raw input rows that failed validation plus a `reason` column.
+    """
+    valid: pd.DataFrame
+    rejected: pd.DataFrame
+
+
+class _Rejections:
+    """Keeps the first failing check of every row."""
+
+    def __init__(self, index:pd.Index):
+        self.reasons = pd.Series('', index=index, dtype=object)
+
+    def add(self, mask:pd.Series, reason:str):
+        self.reasons[mask & (self.reasons == '')] = reason
+
+    def split(self, chunk:pd.DataFrame, frame:pd.DataFrame) -> TransformedBatch:
+        rejected_mask = self.reasons != ''
+        rejected = chunk[rejected_mask].copy()
+        rejected[REASON_COLUMN] = self.reasons[rejected_mask]
+        return TransformedBatch(valid=frame[~rejected_mask].copy(), rejected=rejected)
+
+
+def _strip_blanks(frame:pd.DataFrame, columns:List[str]):
+    for column in columns:
+        values = frame[column].str.strip()
+        frame[column] = values.where(values != '')
+
+
+def normalize_names(names:pd.Series) -> pd.Series:
+    """Uppercases names and drops accents and punctuation, e.g. "Santa Bárbara d'Oeste" -> 'SANTA BARBARA D OESTE'."""
+    return (
+        names.str.normalize('NFKD')
+        .str.encode('ascii', errors='ignore').str.decode('ascii')
+        .str.upper()
+        .str.replace(NON_ALPHANUMERIC, ' ', regex=True)
+        .str.strip()
+    )
+
+
+def normalize_name(name:str) -> str:
+    """normalize_names for a single name, such as a search term."""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', errors='ignore').decode('ascii')
+    return re.sub(NON_ALPHANUMERIC, ' ', ascii_name.upper()).strip()
+
+
+def _capital_max_integer_digits() -> int:
+    field = Company._meta.get_field(CAPITAL_COLUMN)
+    return field.max_digits - field.decimal_places
+
+
+def _capital_max_cents() -> int:
+    """Smallest number of cents that no longer fits the capital_social column."""
+    return 10 ** Company._meta.get_field(CAPITAL_COLUMN).max_digits
+
+
+def parse_capital_to_cents(raw:pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Parses Brazilian formatted decimals ('1.234,56') into int64 cents without going through float.
+    Values without a comma are read with '.' as the decimal point. Missing values become 0.
+    Returns the cents and a boolean mask of the values that could not be parsed.
+    """
+    raw = raw.str.strip()
+    missing = raw.isna() | (raw == '')
+
+    has_comma = raw.str.contains(',', regex=False, na=False)
+    brazilian = raw.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    normalized = raw.where(~has_comma, brazilian)
+
+    parts = normalized.str.extract(CAPITAL_PATTERN)
+    parsed = parts[1].notna()
+    too_large = parts[1].str.lstrip('0').str.len() > _capital_max_integer_digits()
+    valid = parsed & ~too_large.fillna(False)
+
+    integer = parts[1].where(valid, '0').astype('int64')
+    # Keep a third fractional digit to round half away from zero, the same as a numeric(_, 2) column.
+    fraction = parts[2].where(valid, '').fillna('').str.ljust(3, '0')
+    cents = integer * 100 + fraction.str[:2].astype('int64') + (fraction.str[2] >= '5').astype('int64')
+    cents = cents.where(parts[0] != '-', -cents)
+    # Rounding can carry into one more integer digit ('99999999999999,995'), so the limit is checked again on the cents.
+    valid = valid & (cents.abs() < _capital_max_cents())
+    cents = cents.where(valid, 0).astype('int64')
+
+    invalid = ~valid & ~missing
+    return cents, invalid
+
+
+def cents_to_decimal_strings(cents:pd.Series) -> pd.Series:
+    """Formats int64 cents as fixed-point strings ('1234.56') for COPY or Decimal construction."""
+    values = cents.to_numpy(dtype='int64')
+    absolute = np.abs(values)
+    sign = np.where(values < 0, '-', '')
+    integer = pd.Series(absolute // 100, index=cents.index).astype(str)
+    fraction = pd.Series(absolute % 100, index=cents.index).astype(str).str.zfill(2)
+    return sign + integer + '.' + fraction
+
+
+def fingerprint_rows(frame:pd.DataFrame) -> pd.Series:
+    """Vectorized 64-bit hash of each row's content (everything but the cnpj), as signed int64."""
+    hashes = pd.util.hash_pandas_object(frame[FINGERPRINT_SOURCE_COLUMNS], index=False)
+    return pd.Series(hashes.to_numpy().view('int64'), index=frame.index)
+
+
+def transform_chunk(chunk:pd.DataFrame) -> TransformedBatch:
+    """
+    Column-wise transform of a raw Receita Empresas chunk (all columns read as str).
+    Trims string columns, turns blanks into nulls, converts capital_social to cents
+    and validates the fields against the Company model in a single vectorized pass.
+    """
+    frame = chunk.copy()
+    _strip_blanks(frame, STRING_COLUMNS)
+
+    cents, invalid_capital = parse_capital_to_cents(frame[CAPITAL_COLUMN])
+    frame[CAPITAL_COLUMN] = cents
+
+    rejections = _Rejections(frame.index)
+    rejections.add(~frame['cnpj'].str.fullmatch(CNPJ_PATTERN, na=False), 'cnpj: expected 8 digits')
+    for column in STRING_COLUMNS:
+        field = Company._meta.get_field(column)
+        if not field.null:
+            rejections.add(frame[column].isna(), f"{column}: required")
+        rejections.add(frame[column].str.len() > field.max_length, f"{column}: longer than {field.max_length}")
+    rejections.add(invalid_capital, f"{CAPITAL_COLUMN}: invalid decimal")
+
+    batch = rejections.split(chunk, frame)
+    batch.valid[FINGERPRINT_COLUMN] = fingerprint_rows(batch.valid)
+    batch.valid[SEARCH_NAME_COLUMN] = normalize_names(batch.valid['razao_social'])
+    return batch
+
+
+def transform_establishments(chunk:pd.DataFrame,
+                             resolve_municipalities:Callable[[pd.Series, pd.Series], pd.Series]) -> TransformedBatch:
+    """
+    Column-wise transform of a raw Receita Estabelecimentos chunk (all columns read as str).
+    Builds the 14-digit cnpj, parses the YYYYMMDD dates into ISO strings, links every row to its
+    IBGE municipality through `resolve_municipalities(uf, codigo_municipio)` and validates the
+    fields against the Establishment model.
+    """
+    frame = chunk.copy()
+    _strip_blanks(frame, ESTABLISHMENT_STRING_COLUMNS)
+
+    rejections = _Rejections(frame.index)
+    frame['cnpj'] = frame['cnpj_basico'] + frame['cnpj_ordem'] + frame['cnpj_dv']
+    rejections.add(~frame['cnpj'].str.fullmatch(FULL_CNPJ_PATTERN, na=False), 'cnpj: expected 14 digits')
+
+    for column in ESTABLISHMENT_DATE_COLUMNS:
+        raw = frame[column].str.strip()
+        missing = raw.isna() | raw.isin(MISSING_DATES + [''])
+        dates = pd.to_datetime(raw.where(~missing), format='%Y%m%d', errors='coerce')
+        rejections.add(dates.isna() & ~missing, f"{column}: invalid date")
+        frame[column] = dates.dt.strftime('%Y-%m-%d')
+
+    fields = {field.column: field for field in Establishment._meta.concrete_fields}
+    for column in ESTABLISHMENT_STRING_COLUMNS:
+        field = fields.get(column)
+        # The cnpj parts are only checked through the full cnpj above.
+        if field is None or field.is_relation:
+            continue
+        if not field.null:
+            rejections.add(frame[column].isna(), f"{column}: required")
+        rejections.add(frame[column].str.len() > field.max_length, f"{column}: longer than {field.max_length}")
+
+    batch = rejections.split(chunk, frame)
+    batch.valid['municipio_id'] = resolve_municipalities(batch.valid['uf'], batch.valid['codigo_municipio'])
+    return batch
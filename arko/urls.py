@@ -1,12 +1,17 @@
 from django.urls import path
-from .views import StateListView, CompanyListView, DistrictListView, MunicipalityListView, logout_view
+from .views import StateListView, CompanyAnalyticsView, CompanyExportView, CompanyListView, DistrictListView, MunicipalityListView, NameAutocompleteView, PerfPanelView, logout_view
 
 app_name = 'arko'
 
 urlpatterns = [
     path('states/', StateListView.as_view(), name='state-list'),
     path('municipalities/', MunicipalityListView.as_view(), name='municipality-list'),
+    path('municipalities/autocomplete/', NameAutocompleteView.as_view(index='municipalities'), name='municipality-autocomplete'),
     path('districts/', DistrictListView.as_view(), name='district-list'),
+    path('districts/autocomplete/', NameAutocompleteView.as_view(index='districts'), name='district-autocomplete'),
     path('companies/', CompanyListView.as_view(), name='company-list'),
+    path('companies/export/', CompanyExportView.as_view(), name='company-export'),
+    path('companies/analytics/', CompanyAnalyticsView.as_view(), name='company-analytics'),
+    path('_perf/', PerfPanelView.as_view(), name='perf'),
     path('logout/', logout_view, name='logout-custom')
 ]
\ No newline at end of file
@@ -1,11 +1,23 @@
-from django.views.generic import ListView
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views import View
+from django.views.generic import ListView, TemplateView
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth import logout
 from django.shortcuts import redirect
-from .models import State, Municipality, District, Company
+from .analytics import DIMENSION_LABELS, live_breakdown, summary_breakdown
+from .caching import DataVersionCacheMixin
+from .exports import EXPORT_FORMATS, FORMAT_CSV, FORMAT_XLSX, XLSX_MAX_ROWS, export_response
+from .models import COMPANY_DATA, IBGE_DATA, State, Municipality, District, Company, CompanySummary
 from .filters import MunicipalityFilter, CompanyFilter, DistrictFilter, StateFilter
+from .lookups import reference
+from .pagination import EXACT_COUNT_LIMIT, KeysetPaginator, count_up_to
+from .profiling import DUPLICATE_QUERY_THRESHOLD, slow_requests
+from .search import RELEVANCE_FIELD, is_search
 
-class StateListView(LoginRequiredMixin,ListView):
+class StateListView(LoginRequiredMixin,DataVersionCacheMixin,ListView):
+    data_version = IBGE_DATA
     model = State
     template_name = 'arko/state_list.html'
     context_object_name = 'states'
@@ -21,7 +33,8 @@ class StateListView(LoginRequiredMixin,ListView):
         context['filter'] = self.filter
         return context
 
-class MunicipalityListView(LoginRequiredMixin,ListView):
+class MunicipalityListView(LoginRequiredMixin,DataVersionCacheMixin,ListView):
+    data_version = IBGE_DATA
     model = Municipality
     template_name = 'arko/municipality_list.html'
     context_object_name = 'municipalities'
@@ -39,14 +52,15 @@ class MunicipalityListView(LoginRequiredMixin,ListView):
         context['filter'] = self.filter
         return context
     
-class DistrictListView(LoginRequiredMixin,ListView):
+class DistrictListView(LoginRequiredMixin,DataVersionCacheMixin,ListView):
+    data_version = IBGE_DATA
     model = District
     template_name = 'arko/district_list.html'
     context_object_name = 'districts'
     paginate_by = 25
 
     def get_queryset(self):
-        query_set = super().get_queryset().select_related('municipio__estado')
+        query_set = super().get_queryset().select_related('municipio', 'estado')
         self.filter = DistrictFilter(self.request.GET, queryset=query_set)
         return self.filter.qs
     
@@ -61,16 +75,124 @@ class CompanyListView(LoginRequiredMixin,ListView):
     context_object_name = 'companies'
     paginate_by = 25
 
+    # Seek pagination: deep pages cost the same as the first one, and large totals are estimated.
+    keyset_ordering = ('razao_social', 'cnpj')
+
     def get_queryset(self):
         queryset = super().get_queryset()
         self.filter = CompanyFilter(self.request.GET, queryset=queryset)
         return self.filter.qs
 
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        if is_search(queryset) and not paginator.count_is_estimate:
+            # Most relevant first, as long as the matches are few enough to be counted, and so ranked, on every request.
+            paginator.ordering = [f'-{RELEVANCE_FIELD}', *self.keyset_ordering]
+        page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filter
         return context
     
+class CompanyExportView(LoginRequiredMixin,View):
+    """
+    Streams every company matching the CompanyFilter parameters as CSV, JSON Lines or XLSX (`?format=`).
+    XLSX is refused above XLSX_MAX_ROWS companies, since it is built before the download starts.
+    """
+
+    def get(self, request):
+        export_format = request.GET.get('format', FORMAT_CSV)
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest(f"Formato inválido: use {', '.join(EXPORT_FORMATS)}.")
+        queryset = CompanyFilter(request.GET, queryset=Company.objects.all()).qs
+        if export_format == FORMAT_XLSX and count_up_to(queryset, XLSX_MAX_ROWS) > XLSX_MAX_ROWS:
+            return HttpResponseBadRequest(
+                f"O XLSX é limitado a {XLSX_MAX_ROWS} empresas. Refine os filtros ou exporte em CSV ou JSON Lines, que não têm limite."
+            )
+        return export_response(queryset.order_by('cnpj'), export_format, 'empresas', asynchronous=isinstance(request, ASGIRequest))
+
+class CompanyAnalyticsView(LoginRequiredMixin,DataVersionCacheMixin,TemplateView):
+    """
+    Company count and capital_social statistics broken down by one dimension (`?agrupar=`),
+    filtered by the CompanyFilter parameters; each row drills down into its value.
+    Served from the CompanySummary materialized view, except for a razao_social search, which is
+    aggregated live as long as it matches at most EXACT_COUNT_LIMIT companies.
+    """
+    data_version = COMPANY_DATA
+    template_name = 'arko/company_analytics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        self.filter = CompanyFilter(self.request.GET, queryset=Company.objects.all())
+        group_by = self.request.GET.get('agrupar')
+        if group_by not in CompanySummary.DIMENSIONS:
+            group_by = CompanySummary.DIMENSIONS[0]
+        context.update(
+            filter=self.filter, group_by=group_by, group_label=DIMENSION_LABELS[group_by],
+            dimensions=DIMENSION_LABELS, breakdown=None
+        )
+
+        if not self.filter.is_valid():
+            return context
+        filters = {dimension: self.filter.form.cleaned_data.get(dimension) for dimension in CompanySummary.DIMENSIONS}
+        if self.filter.form.cleaned_data.get('razao_social'):
+            if count_up_to(self.filter.qs, EXACT_COUNT_LIMIT) > EXACT_COUNT_LIMIT:
+                context['too_many'] = EXACT_COUNT_LIMIT
+                return context
+            breakdown = live_breakdown(self.filter.qs, group_by)
+        else:
+            breakdown = summary_breakdown(group_by, filters)
+
+        fixed = {dimension for dimension, value in filters.items() if value} | {group_by}
+        next_group_by = next((dimension for dimension in CompanySummary.DIMENSIONS if dimension not in fixed), group_by)
+        for row in breakdown.rows:
+            if row['valor']:
+                row['drill_url'] = self.drill_url(group_by, row['valor'], next_group_by)
+        context['breakdown'] = breakdown
+        return context
+
+    def drill_url(self, dimension, value, next_group_by) -> str:
+        """The current filters narrowed to `dimension` = `value`, broken down by the next dimension."""
+        query = self.request.GET.copy()
+        query[dimension] = value
+        query['agrupar'] = next_group_by
+        return f'?{query.urlencode()}'
+
+class NameAutocompleteView(LoginRequiredMixin,View):
+    """
+    Suggestions for `?q=` from the in-memory name index `index` (see arko.lookups), optionally
+    of one state (`?estado=`), as `{"results": [{"id": ..., "text": ...}]}`.
+    """
+    index = None
+
+    def get(self, request):
+        estado = request.GET.get('estado', '')
+        entries = reference(self.index).search(request.GET.get('q', ''), estado_id=int(estado) if estado.isdigit() else None)
+        return JsonResponse({'results': [{'id': entry.id, 'text': entry.label} for entry in entries]})
+
+class PerfPanelView(LoginRequiredMixin,UserPassesTestMixin,TemplateView):
+    """Per-view averages and slowest requests recorded by PerfMiddleware in this process. Staff only."""
+    template_name = 'arko/perf.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(
+            enabled=bool(settings.PERF_SAMPLE_RATE),
+            sample_rate=settings.PERF_SAMPLE_RATE,
+            explain_threshold_ms=settings.PERF_EXPLAIN_THRESHOLD_MS,
+            window_minutes=settings.PERF_WINDOW_SECONDS // 60,
+            duplicate_threshold=DUPLICATE_QUERY_THRESHOLD,
+            profiled=slow_requests.profiled,
+            views=slow_requests.views(),
+            slowest=slow_requests.slowest(),
+        )
+        return context
+
 def logout_view(request):
     logout(request)
 
@@ -0,0 +1,28 @@
+from django import forms
+from django.urls import reverse
+
+from .lookups import reference
+
+
+class AutocompleteWidget(forms.Widget):
+    """
+    Text input suggesting names from an autocomplete endpoint, which submits the id of the chosen
+    one in a hidden input. `forward` names other fields of the form sent along with the term,
+    e.g. 'estado' to only suggest the municipalities of the selected state.
+    """
+    template_name = 'arko/widgets/autocomplete.html'
+
+    def __init__(self, url_name:str, index:str, forward=(), attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.index = index
+        self.forward = list(forward)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget'].update(
+            url=reverse(self.url_name),
+            label=reference(self.index).label(value) if value else None,
+            forward=','.join(self.forward),
+        )
+        return context
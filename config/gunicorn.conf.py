@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for serving the project under ASGI with uvicorn workers:
+
+    gunicorn config.asgi:application -c config/gunicorn.conf.py
+
+Every worker is a process running a uvicorn event loop, where the async views of the JSON
+API (/api/) run. Django 5.2 still runs the ORM queries of async views, and the sync views,
+on one thread per worker, so throughput grows with the number of workers.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn_worker.UvicornWorker'
+# 2 x CPUs + 1: while a worker waits on Postgres, the others keep the CPUs busy.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Restart workers every few thousand requests, with jitter so they do not all restart at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+accesslog = '-'
+# Under ASGI every request runs its sync code, ORM queries included, in a thread of its own, so a
+# persistent connection is never reused: it stays open until the thread is collected, piling up
+# idle backends. Connections are closed after each request instead.
+raw_env = ['DB_CONN_MAX_AGE=0']
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'arko.apps.ArkoConfig',
     'django_filters',
 ]
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'arko.profiling.PerfMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -154,8 +156,43 @@ DATABASES = {
         'PASSWORD': env('DB_PASS'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # Seconds a connection is reused across requests (0 closes it after each request, None never does).
+        # Connections are checked before being reused, so one dropped by Postgres is simply reopened.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Optional read replica: the list, filter and export pages read from it (see arko.routers).
+# Unset fields fall back to the primary's, so DB_REPLICA_HOST alone is enough for a standby of it.
+if env('DB_REPLICA_HOST', default=None):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': env('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': env('DB_REPLICA_PASS', default=DATABASES['default']['PASSWORD']),
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['arko.routers.PrimaryReplicaRouter']
+
+# --- CACHE ---
+# Local memory by default; point CACHE_URL at Redis or Memcached to share it between processes.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# --- IBGE API ---
+IBGE_API_URL = env('IBGE_API_URL', default='https://servicodados.ibge.gov.br/api/v1/localidades')
+IBGE_CACHE_DIR = env('IBGE_CACHE_DIR', default=None)
+
+# --- PERFORMANCE PROFILING ---
+# Share of requests profiled by arko.profiling.PerfMiddleware and listed at /app/_perf/ (0 disables it).
+PERF_SAMPLE_RATE = env.float('PERF_SAMPLE_RATE', default=0.0)
+# Queries slower than this get an EXPLAIN (ANALYZE, BUFFERS) in the panel.
+PERF_EXPLAIN_THRESHOLD_MS = env.float('PERF_EXPLAIN_THRESHOLD_MS', default=200.0)
+PERF_SLOWEST_REQUESTS = env.int('PERF_SLOWEST_REQUESTS', default=50)
+PERF_WINDOW_SECONDS = env.int('PERF_WINDOW_SECONDS', default=60 * 60)
 
 LOGIN_URL = 'login' 
 
@@ -26,4 +26,6 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')), 
 
     path('app/', include('arko.urls', namespace='arko')),
+
+    path('api/', include('arko.api_urls', namespace='api')),
 ]